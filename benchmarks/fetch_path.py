@@ -0,0 +1,118 @@
+"""
+Compares the legacy `pd.read_sql` fetch path with the Arrow fetch path of the data layer.
+
+Runs each retrieval method against the backend selected by DATA_BACKEND, bypassing the result cache:
+
+    python benchmarks/fetch_path.py retrieve_host_rollup suhas_query_6 --repeat 5
+
+Peak memory is the Python heap peak (tracemalloc) plus the peak of Arrow's memory pool, which
+tracemalloc does not see.
+"""
+import argparse
+import sys
+import threading
+import time
+import tracemalloc
+from os.path import abspath, dirname, join
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "streamlit"))
+
+from data import get_connector  # noqa: E402
+from util import handle_env  # noqa: E402
+
+
+def legacy_read_sql(connector):
+    """The fetch path the connectors used before, rows go through Python tuples"""
+    def read_sql(query, params=None):
+        with connector.pool.connection() as connection:
+            if hasattr(connection, "is_closed"):
+                query, *params = connector.bind(query, params)
+                return pd.read_sql(query, connection, params=params[0] if params else None)
+            # DuckDB cursors are not DB-API connections pandas understands, fetch the tuples the same way
+            cursor = connection.execute(*connector.bind(query, params))
+            frame = pd.DataFrame.from_records(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+            frame.columns = frame.columns.str.upper()
+            return frame
+    return read_sql
+
+
+class ArrowPeak:
+    """Peak bytes held by Arrow's default memory pool during the block, above what it held before"""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.bytes = 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.pool = pa.default_memory_pool()
+        self.baseline = self.pool.bytes_allocated()
+        self.previous_max = self.pool.max_memory()
+        self.peak = self.baseline
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.pool.bytes_allocated())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        # The pool only keeps its all-time high, which is exact whenever the block set a new one
+        if self.pool.max_memory() > self.previous_max:
+            self.peak = max(self.peak, self.pool.max_memory())
+        self.bytes = self.peak - self.baseline
+
+
+def measure(fn, repeat: int):
+    timings, peaks = [], []
+    for _ in range(repeat):
+        tracemalloc.start()
+        with ArrowPeak() as arrow:
+            start = time.perf_counter()
+            frame = fn()
+            timings.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1] + arrow.bytes)
+        tracemalloc.stop()
+    return frame, min(timings), max(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("methods", nargs="*", default=["retrieve_host_rollup", "suhas_query_6"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    handle_env()
+    connector = get_connector()
+    # Only cached methods run SQL of their own, the others are derived in memory from cached results
+    uncached = [name for name in args.methods if not hasattr(getattr(type(connector), name, None), "__wrapped__")]
+    if uncached:
+        parser.error(f"not a cached SQL-backed retrieval method: {', '.join(uncached)}")
+    arrow_read_sql = connector.read_sql
+
+    print(f"{'method':28s} {'rows':>8s} {'legacy ms':>10s} {'arrow ms':>10s} {'legacy peak MB':>15s} {'arrow peak MB':>14s}")
+    for name in args.methods:
+        # __wrapped__ is the undecorated method, so the result cache is not involved
+        method = getattr(type(connector), name).__wrapped__
+
+        connector.read_sql = legacy_read_sql(connector)
+        legacy_frame, legacy_time, legacy_peak = measure(lambda: method(connector), args.repeat)
+        connector.read_sql = arrow_read_sql
+        arrow_frame, arrow_time, arrow_peak = measure(lambda: method(connector), args.repeat)
+
+        assert list(legacy_frame.columns) == list(arrow_frame.columns), f"{name}: column mismatch"
+        print(
+            f"{name:28s} {len(arrow_frame):8d} {legacy_time * 1000:10.1f} {arrow_time * 1000:10.1f} "
+            f"{legacy_peak / 2**20:15.2f} {arrow_peak / 2**20:14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
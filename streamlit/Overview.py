@@ -1,9 +1,13 @@
 import streamlit as st
 
+from data import get_connector
 from util import handle_env
 
 handle_env()
 
+# Starts the background warm-up of every page's datasets as soon as the first visitor lands
+get_connector()
+
 st.set_page_config(
    page_title="Overview",
    page_icon="🏠",
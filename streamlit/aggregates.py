@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+from os.path import exists, join
+
+import pandas as pd
+
+# Time series granularities, finest first, named like the DATE_TRUNC date parts
+GRANULARITIES = ("day", "week", "month", "quarter")
+
+# Fewest points an automatically picked granularity has to give over the selected range
+MIN_POINTS = int(os.getenv("SERIES_MIN_POINTS", 40))
+
+# Dates the incremental aggregates start from on a full rebuild, and read up to when only some listings changed
+FIRST_DATE = "1900-01-01"
+LAST_DATE = "9999-12-31"
+
+
+def truncate_dates(dates: pd.Series, granularity: str) -> pd.Series:
+    """pandas equivalent of DATE_TRUNC(granularity, date), weeks start on Monday"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}', expected one of {list(GRANULARITIES)}")
+    dates = pd.to_datetime(dates)
+    if granularity == "day":
+        return dates
+    return dates.dt.to_period({"week": "W", "month": "M", "quarter": "Q"}[granularity]).dt.start_time
+
+
+def roll_up(frame: pd.DataFrame, start: str, end: str, granularity: str, columns: list) -> pd.DataFrame:
+    """Daily rows of `frame` between start and end (inclusive), with `columns` summed per period"""
+    dates = pd.to_datetime(frame['DATE'])
+    frame = frame[(dates >= pd.Timestamp(start or "1900-01-01")) & (dates <= pd.Timestamp(end or "2262-04-11"))]
+    periods = truncate_dates(frame['DATE'], granularity).rename('DATE')
+    return frame[columns].groupby(periods).sum().reset_index()
+
+
+def pyramid(daily: pd.DataFrame, columns: list, by: list = ()) -> pd.DataFrame:
+    """`columns` of the daily rows summed per `by` keys and period at every granularity, stacked under a GRANULARITY column"""
+    levels = []
+    for granularity in GRANULARITIES:
+        periods = truncate_dates(daily['DATE'], granularity).rename('DATE')
+        # A null key (e.g. the whole-city rows) is a group of its own
+        level = daily[columns].groupby([daily[key] for key in by] + [periods], dropna=False).sum().reset_index()
+        level.insert(0, 'GRANULARITY', granularity)
+        levels.append(level)
+    return pd.concat(levels, ignore_index=True)
+
+
+def pick_granularity(start, end, min_points: int = MIN_POINTS) -> str:
+    """Coarsest granularity that still gives `min_points` periods between start and end"""
+    days = pd.Series(pd.date_range(start, end, freq="D"))
+    for granularity in reversed(GRANULARITIES):
+        if truncate_dates(days, granularity).nunique() >= min_points:
+            return granularity
+    return "day"
+
+
+class IncrementalAggregate:
+    """
+    Per-date aggregate of the calendar table stored on disk. Each update re-aggregates only the dates from the
+    earliest one a load touched (see DataConnector.earliest_change) and keeps the rows before it.
+    """
+
+    TABLE = "calendar"
+
+    def __init__(self, directory: str, name: str):
+        self.path = join(directory, f"{name}.parquet")
+        self.state_path = join(directory, f"{name}.json")
+        self._lock = threading.Lock()
+        self._frame = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def state(self) -> dict:
+        """{"watermark": latest date aggregated, "marker": change marker of the table at that update}, empty before the first"""
+        if not exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    @property
+    def watermark(self):
+        """Latest calendar date already aggregated, or None before the first update"""
+        return self.state.get("watermark")
+
+    def update(self, connector, *inputs) -> pd.DataFrame:
+        """Re-aggregates the dates from the earliest one changed since the last update and returns the full aggregate"""
+        with self._lock:
+            frame = self._load()
+            # Taken before reading, so rows loaded while this update runs are picked up by the next one
+            marker = connector.change_marker(self.TABLE)
+            since = self._since(connector, frame, marker)
+            updated = self._update(connector, frame, since, *inputs)
+            if updated is not None:
+                frame = updated.sort_values(self.KEYS, ignore_index=True)
+                self._write(frame)
+                self._frame = frame
+            if updated is not None or self.state.get("marker") != marker:
+                # Also saved when the table was reloaded without a row changing, e.g. the same export rewritten
+                self._save(pd.to_datetime(frame['DATE']).max().date().isoformat() if len(frame) else None, marker)
+            return frame.copy()
+
+    def aggregate(self, connector, since: str, *inputs) -> pd.DataFrame:
+        """Aggregate of the dates from `since` on"""
+        raise NotImplementedError
+
+    def reset(self):
+        """Drops the aggregate so the next update re-aggregates the whole table"""
+        with self._lock:
+            self._frame = None
+            for path in self._paths():
+                if exists(path):
+                    os.remove(path)
+
+    def _update(self, connector, frame, since, *inputs):
+        """The new aggregate, None when nothing changed"""
+        if since is None:
+            return None
+        new = self.aggregate(connector, since, *inputs)
+        if frame is None:
+            return new
+        kept = frame[pd.to_datetime(frame['DATE']) < pd.Timestamp(since)]
+        return pd.concat([kept, new], ignore_index=True) if len(kept) else new
+
+    def _since(self, connector, frame, marker: dict):
+        """First date to re-aggregate, None when the table has not changed since the last update"""
+        previous = self.state.get("marker")
+        if frame is None or previous is None:
+            return FIRST_DATE
+        if previous["version"] == marker["version"]:
+            return None
+        try:
+            earliest = connector.earliest_change(self.TABLE, "date", previous)
+        except Exception:
+            # The backend cannot tell which rows changed (no change tracking, a removed export), so all are
+            return FIRST_DATE
+        if earliest is None:
+            return None
+        return pd.Timestamp(earliest).date().isoformat()
+
+    def _paths(self) -> list:
+        return [self.path, self.state_path]
+
+    def _write(self, frame: pd.DataFrame):
+        frame.to_parquet(self.path, index=False)
+
+    def _save(self, watermark, marker: dict):
+        with open(self.state_path, "w") as f:
+            json.dump({"watermark": watermark, "marker": marker}, f)
+
+    def _load(self):
+        if self._frame is None and exists(self.path) and exists(self.state_path):
+            self._frame = pd.read_parquet(self.path)
+        return self._frame
+
+
+class DailyPriceAggregate(IncrementalAggregate):
+    """Price sum, count, min, max and availability counts of the whole city per date"""
+
+    KEYS = ['DATE']
+
+    # Only the dates from the earliest changed one are scanned, so the cost scales with what a load touched
+    QUERY = """
+        SELECT
+            date,
+            SUM(price) AS price_sum,
+            COUNT(price) AS price_count,
+            MIN(price) AS min_price,
+            MAX(price) AS max_price,
+            SUM(CASE WHEN CAST(available AS VARCHAR) IN ('t', 'true', '1') THEN 1 ELSE 0 END) AS available_count,
+            SUM(CASE WHEN CAST(available AS VARCHAR) IN ('t', 'true', '1') THEN 0 ELSE 1 END) AS unavailable_count
+        FROM calendar
+        WHERE date >= CAST(%(since)s AS DATE)
+        GROUP BY date
+        ORDER BY date;
+    """
+
+    def aggregate(self, connector, since: str) -> pd.DataFrame:
+        return connector.read_sql(self.QUERY, {"since": since})
+
+
+class CommunityPriceAggregate(IncrementalAggregate):
+    """
+    Price sum and count per community and date, by the community each listing is assigned to. The assignment is
+    passed to update() as a LISTING_ID-indexed COMMUNITY_ID series and stored with the aggregate; when it changes,
+    only the calendar rows of the reassigned listings are read to move their prices between communities.
+    """
+
+    KEYS = ['COMMUNITY_ID', 'DATE']
+
+    # Above this share of reassigned listings the whole table is aggregated again instead
+    MAX_REASSIGNED = 0.25
+
+    # Listing ids per IN list when reading the rows of reassigned listings
+    CHUNK_SIZE = 1000
+
+    QUERY = """
+        SELECT listing_id, date, price
+        FROM calendar
+        WHERE date >= CAST(%(since)s AS DATE);
+    """
+
+    LISTINGS_QUERY = """
+        SELECT listing_id, date, price
+        FROM calendar
+        WHERE listing_id IN ({listing_ids}) AND date < CAST(%(until)s AS DATE);
+    """
+
+    def __init__(self, directory: str, name: str):
+        super().__init__(directory, name)
+        self.communities_path = join(directory, f"{name}_communities.parquet")
+        self._communities = None
+
+    def aggregate(self, connector, since: str, communities: pd.Series) -> pd.DataFrame:
+        return by_community(connector.read_sql(self.QUERY, {"since": since}), communities)
+
+    def _update(self, connector, frame, since, communities: pd.Series):
+        self._communities = communities = communities.dropna().astype('int64')
+        previous = self._stored_communities() if frame is not None else None
+        reassigned = []
+        if previous is not None:
+            joined = pd.concat([previous.rename('BEFORE'), communities.rename('AFTER')], axis=1)
+            reassigned = joined.index[joined['BEFORE'].ne(joined['AFTER'])]
+            if len(reassigned) > self.MAX_REASSIGNED * len(communities):
+                since, reassigned = FIRST_DATE, []
+        elif frame is not None:
+            since = FIRST_DATE
+        updated = super()._update(connector, frame, since, communities)
+        if len(reassigned):
+            # The dates from `since` on were just aggregated with the new assignment, only the earlier ones move
+            rows = pd.concat([
+                connector.read_sql(self.LISTINGS_QUERY.format(listing_ids=", ".join(str(int(listing_id)) for listing_id in chunk)),
+                                   {"until": since or LAST_DATE})
+                for chunk in (reassigned[i:i + self.CHUNK_SIZE] for i in range(0, len(reassigned), self.CHUNK_SIZE))
+            ], ignore_index=True)
+            moved = (frame if updated is None else updated).set_index(self.KEYS)
+            moved = moved.add(by_community(rows, communities).set_index(self.KEYS), fill_value=0)
+            moved = moved.sub(by_community(rows, previous).set_index(self.KEYS), fill_value=0)
+            updated = moved[moved['PRICE_COUNT'] > 0].astype({'PRICE_COUNT': 'int64'}).reset_index()
+        return updated
+
+    def _write(self, frame: pd.DataFrame):
+        super()._write(frame)
+        assignment = pd.DataFrame({'LISTING_ID': self._communities.index, 'COMMUNITY_ID': self._communities.to_numpy()})
+        assignment.to_parquet(self.communities_path, index=False)
+
+    def _stored_communities(self):
+        """Assignment the stored aggregate was built with"""
+        if not exists(self.communities_path):
+            return None
+        stored = pd.read_parquet(self.communities_path)
+        return pd.Series(stored['COMMUNITY_ID'].to_numpy(), index=stored['LISTING_ID'].to_numpy())
+
+    def _paths(self) -> list:
+        return super()._paths() + [self.communities_path]
+
+
+def by_community(rows: pd.DataFrame, communities: pd.Series) -> pd.DataFrame:
+    """Price sum and count of calendar `rows` per community and date; listings without a community are left out"""
+    grouped = pd.to_numeric(rows['PRICE']).astype(float).groupby([
+        rows['LISTING_ID'].map(communities).rename('COMMUNITY_ID'),
+        pd.to_datetime(rows['DATE']).rename('DATE'),
+    ])
+    return pd.DataFrame({'PRICE_SUM': grouped.sum(), 'PRICE_COUNT': grouped.count()}).reset_index()
@@ -0,0 +1,115 @@
+"""
+Amenity dictionary and per-amenity listing bitmaps.
+
+The `amenities` JSON text of each listing is parsed once into a sorted dictionary of amenity names
+and, per amenity, a bitmap over the listings (bit i set when listing i offers it). Any selection of
+amenities is then a bitwise AND of a few bitmaps, with no string scans.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+# Amenities the Listing Characteristics chart starts with
+DEFAULT_AMENITIES = ["Wifi", "Air conditioning", "Pool", "Bathtub", "Central heating", "Free parking on premises", "Free street parking"]
+
+
+def parse_amenities(texts) -> list:
+    """The amenity list of every JSON text, empty for missing or malformed ones"""
+    parsed = []
+    for text in texts:
+        try:
+            amenities = json.loads(text) if isinstance(text, str) else []
+        except ValueError:
+            amenities = []
+        parsed.append(amenities if isinstance(amenities, list) else [])
+    return parsed
+
+
+def listings_version(listing_ids, texts) -> str:
+    """Hash of the listing ids and amenities JSON a set of bitmaps is built from, in row order"""
+    digest = hashlib.sha1(np.asarray(listing_ids, dtype=np.int64).tobytes())
+    digest.update("\x1f".join(text if isinstance(text, str) else "" for text in texts).encode())
+    return digest.hexdigest()[:16]
+
+
+def build_bitmaps(amenity_lists: list) -> pd.DataFrame:
+    """One row per distinct amenity in name order, with its listing count and packed listing bitmap"""
+    names = sorted({name for amenities in amenity_lists for name in amenities})
+    codes = {name: code for code, name in enumerate(names)}
+
+    # Inverted index: (amenity code, listing row) pairs scattered into a bit matrix
+    rows = np.repeat(np.arange(len(amenity_lists)), [len(amenities) for amenities in amenity_lists])
+    columns = np.fromiter((codes[name] for amenities in amenity_lists for name in amenities), dtype=np.int64, count=len(rows))
+    matrix = np.zeros((len(names), len(amenity_lists)), dtype=bool)
+    matrix[columns, rows] = True
+
+    packed = np.packbits(matrix, axis=1)
+    return pd.DataFrame({
+        'AMENITY': names,
+        'LISTING_COUNT': matrix.sum(axis=1),
+        'BITMAP': [row.tobytes() for row in packed],
+    })
+
+
+class AmenityIndex:
+    """Average price, count and price lift of listings offering any selection of amenities"""
+
+    def __init__(self, prices, bitmaps: pd.DataFrame):
+        self.prices = np.asarray(prices, dtype=float)
+        self.names = bitmaps['AMENITY'].tolist()
+        self._codes = {name: code for code, name in enumerate(self.names)}
+        width = (len(self.prices) + 7) // 8
+        self.bits = np.stack([np.frombuffer(bitmap, dtype=np.uint8) for bitmap in bitmaps['BITMAP']]) if self.names \
+            else np.zeros((0, width), dtype=np.uint8)
+        self._priced = ~np.isnan(self.prices)
+        self._summary = None
+
+    def mask(self, amenities) -> np.ndarray:
+        """Listings offering every one of `amenities`"""
+        selected = np.bitwise_and.reduce(self.bits[[self._codes[name] for name in amenities]], axis=0) if len(amenities) \
+            else np.full(self.bits.shape[1], 0xFF, dtype=np.uint8)
+        return np.unpackbits(selected, count=len(self.prices)).astype(bool)
+
+    def _stats(self, mask: np.ndarray) -> dict:
+        with_price = mask & self._priced
+        without_price = ~mask & self._priced
+        average = self.prices[with_price].mean() if with_price.any() else np.nan
+        average_without = self.prices[without_price].mean() if without_price.any() else np.nan
+        return {
+            'LISTING_COUNT': int(mask.sum()),
+            'AVERAGE_PRICE': average,
+            'AVERAGE_PRICE_WITHOUT': average_without,
+            # Relative difference to the listings without the selection
+            'PRICE_LIFT': average / average_without - 1,
+        }
+
+    def select(self, amenities) -> dict:
+        """Statistics of the listings offering all of `amenities`"""
+        return self._stats(self.mask(amenities))
+
+    def summary(self) -> pd.DataFrame:
+        """Statistics of every amenity on its own, from one pass over the bit matrix, computed once per index"""
+        if self._summary is None:
+            self._summary = self._summarize()
+        return self._summary.copy()
+
+    def _summarize(self) -> pd.DataFrame:
+        matrix = np.unpackbits(self.bits, axis=1, count=len(self.prices)).astype(bool)
+        prices = np.where(self._priced, self.prices, 0.0)
+        counts = matrix.sum(axis=1)
+        priced_with = matrix @ self._priced.astype(float)
+        sums_with = matrix @ prices
+        priced_without = self._priced.sum() - priced_with
+        sums_without = prices.sum() - sums_with
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average = sums_with / priced_with
+            average_without = sums_without / priced_without
+        return pd.DataFrame({
+            'AMENITY': self.names,
+            'LISTING_COUNT': counts,
+            'AVERAGE_PRICE': average,
+            'AVERAGE_PRICE_WITHOUT': average_without,
+            'PRICE_LIFT': average / average_without - 1,
+        })
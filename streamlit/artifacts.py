@@ -0,0 +1,22 @@
+"""
+Derived datasets the pages compute from the retrieval methods' results.
+
+Each artifact is a function of a connector returning a DataFrame, so it can be computed on
+demand or precomputed into a bundle (see precompute.py). Each is cached with the tables it reads,
+so a reload only invalidates the artifacts built from that table.
+"""
+import pandas as pd
+
+from binning import prefix_sums
+from cache import cached
+
+
+@cached("listings")
+def host_experience_prefix_sums(connector) -> pd.DataFrame:
+    """Running listing counts and price sums by days as host, binned by the Host Insights page (see binning.py)"""
+    return prefix_sums(connector.suhas_query_6(), 'DAYS_AS_HOST', ['LISTING_COUNT', 'PRICE_SUM'])
+
+
+ARTIFACTS = {
+    'host_experience_prefix_sums': host_experience_prefix_sums,
+}
@@ -0,0 +1,42 @@
+"""
+Weighted binning over a sorted key with prefix sums.
+
+The rows are sorted by the key once and the running totals of the summed columns kept. The totals
+of a bin are then the difference of two running totals found by binary search, so any bin count or
+set of edges is answered in O(bins log rows) without touching the rows again.
+"""
+import numpy as np
+import pandas as pd
+
+
+def prefix_sums(frame: pd.DataFrame, key: str, columns: list) -> pd.DataFrame:
+    """One row per distinct `key` in ascending order, with the running totals of `columns` up to and including it"""
+    totals = frame.groupby(key)[columns].sum().sort_index().astype(float)
+    return totals.cumsum().reset_index()
+
+
+def bin_totals(prefix: pd.DataFrame, key: str, edges) -> pd.DataFrame:
+    """
+    Totals of every running-total column of `prefix` per bin between consecutive edges. Bins hold
+    the keys in (low, high] like pd.cut, except the first one also holds its low edge.
+    """
+    keys = prefix[key].to_numpy()
+    edges = np.asarray(edges, dtype=float)
+    # Position after the last key <= each edge, and before the first key >= the lowest edge
+    positions = np.searchsorted(keys, edges, side="right")
+    positions[0] = np.searchsorted(keys, edges[0], side="left")
+
+    binned = pd.DataFrame({
+        key: [str(pd.Interval(round(low, 1), round(high, 1))) for low, high in zip(edges[:-1], edges[1:])],
+        'LOW': edges[:-1],
+        'HIGH': edges[1:],
+    })
+    for column in prefix.columns.drop(key):
+        running = np.concatenate(([0.0], prefix[column].to_numpy()))
+        binned[column] = running[positions[1:]] - running[positions[:-1]]
+    return binned
+
+
+def equal_width_edges(low: float, high: float, bins: int) -> np.ndarray:
+    """Edges of `bins` equal-width bins spanning low to high"""
+    return np.linspace(low, high, bins + 1)
@@ -0,0 +1,383 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from os.path import join
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts) -> str:
+    """Stable cache key for a method name plus its parameters"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier DataFrame cache: an in-memory LRU with a byte budget and TTL, backed by Parquet files on disk
+    with a byte budget of their own. Files not read for `disk_ttl` seconds are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 2**20, ttl: float = 24 * 3600,
+                 max_disk_bytes: int = 2 * 2**30, disk_ttl: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_ttl = disk_ttl
+
+        self._entries = OrderedDict()  # key -> (frame, nbytes, created_at, tables), most recently used last
+        self._nbytes = 0
+        self._files = OrderedDict()  # key -> (path, nbytes, tables, last_used), most recently used last
+        self._disk_bytes = 0
+        self._listed = None  # mtime of the directory when its files were last listed
+        self._generations = {}  # table -> count of invalidations, so a read or write racing one is not kept
+        self._lock = threading.RLock()
+        self._stats = {
+            "memory_hits": 0, "disk_hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+            "disk_evictions": 0, "expired": 0,
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._list_files()
+            expired = self._evict_files()
+        self._remove(expired)
+
+    def get(self, key: str):
+        """
+        Returns (frame, stale) for `key`, or (None, False) on a miss.
+        
+        Results older than the TTL, or computed from a table marked stale, are still returned so
+        callers can serve them while a fresh copy is computed in the background.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._touch(key)
+                stale = self._is_stale(entry[2])
+                self._stats["stale_hits" if stale else "memory_hits"] += 1
+                return entry[0], stale
+
+            path = self._find_file(key)
+            if path is None:
+                self._stats["misses"] += 1
+                return None, False
+            tables = self._files[key][2]
+            generation = self._generation(tables)
+
+        # Reading the file does not hold up other sessions' cache reads
+        try:
+            frame = pd.read_parquet(path)
+            created_at = os.path.getmtime(path)
+            # The access time records the last use, so a restart knows which files are still read
+            os.utime(path, (time.time(), created_at))
+        except FileNotFoundError:
+            frame = None
+
+        with self._lock:
+            if frame is None or self._generation(tables) != generation:
+                # Evicted, invalidated or marked stale while it was read
+                self._stats["misses"] += 1
+                return None, False
+            self._remember(key, frame, created_at, tables)
+            self._touch(key)
+            stale = self._is_stale(created_at)
+            self._stats["stale_hits" if stale else "disk_hits"] += 1
+            return frame, stale
+
+    def put(self, key: str, frame: pd.DataFrame, tables=()):
+        """Stores `frame` in both tiers, tagged with the tables it was computed from"""
+        tables = tuple(tables)
+        with self._lock:
+            self._remember(key, frame, time.time(), tables)
+            generation = self._generation(tables)
+
+        # Written outside the lock, to a temp file first so a concurrent reader never sees a partial file
+        path = self._path(key, tables)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            frame.to_parquet(temporary, compression="zstd", index=False)
+            os.replace(temporary, path)
+            nbytes = os.path.getsize(path)
+        except Exception:
+            # Frames Parquet cannot represent still live in the memory tier
+            self._remove([temporary])
+            return
+
+        with self._lock:
+            if self._generation(tables) != generation:
+                # A table it was computed from changed while it was written, keep it out of the disk tier
+                remove = [path]
+            else:
+                self._add_file(key, path, nbytes, tables, time.time())
+                remove = self._evict_files()
+        self._remove(remove)
+
+    def invalidate(self, table: str):
+        """Drops every cached result computed from `table`, in memory and on disk"""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if table in entry[3]]:
+                self._drop(key)
+            self._list_files()
+            paths = [self._forget(key) for key, entry in list(self._files.items()) if table in entry[2]]
+            self._generations[table] = self._generations.get(table, 0) + 1
+            self._stats["invalidations"] += 1
+        self._remove(paths)
+
+    def mark_stale(self, table: str):
+        """Marks every result computed from `table` as stale without dropping it"""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if table in entry[3]:
+                    self._entries[key] = (entry[0], entry[1], 0, entry[3])
+            self._list_files()
+            paths = [entry[0] for entry in self._files.values() if table in entry[2]]
+            self._generations[table] = self._generations.get(table, 0) + 1
+        for path in paths:
+            try:
+                # The file's mtime is its creation time, so an epoch mtime keeps it stale across restarts
+                os.utime(path, (time.time(), 0))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._list_files()
+            paths = [self._forget(key) for key in list(self._files)]
+        self._remove(paths)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries), "bytes": self._nbytes, "max_bytes": self.max_bytes,
+                "disk_files": len(self._files), "disk_bytes": self._disk_bytes, "max_disk_bytes": self.max_disk_bytes,
+                **self._stats,
+            }
+
+    def _is_stale(self, created_at) -> bool:
+        return time.time() - created_at > self.ttl
+
+    def _generation(self, tables) -> tuple:
+        return tuple(self._generations.get(table, 0) for table in tables)
+
+    def _remember(self, key, frame, created_at, tables):
+        nbytes = int(frame.memory_usage(deep=True).sum())
+        if key in self._entries:
+            self._drop(key)
+        if nbytes > self.max_bytes:
+            # Too large for the memory tier, the disk tier still serves it
+            return
+        self._entries[key] = (frame, nbytes, created_at, tables)
+        self._nbytes += nbytes
+        while self._nbytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def _drop(self, key):
+        self._nbytes -= self._entries.pop(key)[1]
+
+    def _path(self, key, tables) -> str:
+        # Table names are encoded in the file name so invalidation does not have to open any file
+        return join(self.directory, f"{'+'.join(sorted(tables)) or '_'}__{key}.parquet")
+
+    def _find_file(self, key):
+        if key not in self._files:
+            # Another process may have written it since the directory was last listed
+            self._list_files()
+        return self._files[key][0] if key in self._files else None
+
+    def _list_files(self):
+        # Lists the directory again only when entries were added or removed since the last listing
+        listed = os.stat(self.directory).st_mtime_ns
+        if listed == self._listed:
+            return
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".parquet") and "__" in entry.name:
+                    key = entry.name[:-len(".parquet")].split("__", 1)[1]
+                    stat = entry.stat()
+                    last_used = max(stat.st_atime, self._files[key][3] if key in self._files else 0)
+                    files.append((last_used, key, entry.path, stat.st_size))
+        self._files.clear()
+        self._disk_bytes = 0
+        for last_used, key, path, nbytes in sorted(files):
+            self._add_file(key, path, nbytes, self._tables_from_path(path), last_used)
+        self._listed = listed
+
+    def _add_file(self, key, path, nbytes, tables, last_used):
+        if key in self._files:
+            self._forget(key)
+        self._files[key] = (path, nbytes, tables, last_used)
+        self._disk_bytes += nbytes
+
+    def _forget(self, key) -> str:
+        path, nbytes, _, _ = self._files.pop(key)
+        self._disk_bytes -= nbytes
+        return path
+
+    def _touch(self, key):
+        if key in self._files:
+            path, nbytes, tables, _ = self._files.pop(key)
+            self._files[key] = (path, nbytes, tables, time.time())
+
+    def _evict_files(self) -> list:
+        """Paths of the files unused for longer than `disk_ttl`, then of the least recently used ones over the budget"""
+        cutoff = time.time() - self.disk_ttl
+        paths = []
+        for key in [key for key, entry in self._files.items() if entry[3] < cutoff]:
+            paths.append(self._forget(key))
+            self._stats["expired"] += 1
+        while self._disk_bytes > self.max_disk_bytes:
+            paths.append(self._forget(next(iter(self._files))))
+            self._stats["disk_evictions"] += 1
+        return paths
+
+    @staticmethod
+    def _remove(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _tables_from_path(path) -> tuple:
+        prefix = os.path.basename(path).split("__", 1)[0]
+        return tuple(prefix.split("+"))
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into a single execution whose result every caller receives"""
+
+    def __init__(self):
+        self._calls = {}  # key -> Future of the execution in flight
+        self._lock = threading.Lock()
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self._stats["executions"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def busy(self, key: str) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def stats(self) -> dict:
+        """`coalesced` counts the duplicate executions that were avoided"""
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
+
+
+RESULT_CACHE = ResultCache(
+    directory=os.getenv("CACHE_DIR", join(os.getcwd(), ".cache")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", 256 * 2**20)),
+    ttl=float(os.getenv("CACHE_TTL", 24 * 3600)),
+    max_disk_bytes=int(os.getenv("CACHE_MAX_DISK_BYTES", 2 * 2**30)),
+    disk_ttl=float(os.getenv("CACHE_DISK_TTL", 7 * 24 * 3600)),
+)
+IN_FLIGHT = SingleFlight()
+
+# Recomputes stale results off the request path
+_REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refresh")
+
+# Depth of the revalidating blocks running on each thread, see revalidating()
+_REVALIDATING = threading.local()
+
+
+@contextmanager
+def revalidating():
+    """Within the block, stale cached results are recomputed before they are returned instead of in the background"""
+    _REVALIDATING.depth = getattr(_REVALIDATING, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _REVALIDATING.depth -= 1
+
+
+def cached(*tables):
+    """
+    Decorator for retrieval methods: caches the returned frame by method name and parameters.
+    
+    Stale results are served immediately while they are recomputed in the background
+    (stale-while-revalidate), except to another cached method computing its own result: that one
+    waits for the fresh result, so nothing fresh is built from stale data.
+    `method.refresh(connector, ...)` recomputes a result on demand.
+    """
+    def decorator(method):
+        def method_key(self, args, kwargs):
+            return make_key(self.backend_key(), method.__name__, args, sorted(kwargs.items()))
+
+        def load(self, key, *args, **kwargs):
+            with revalidating():
+                frame = method(self, *args, **kwargs)
+            RESULT_CACHE.put(key, frame, tables)
+            return frame
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = method_key(self, args, kwargs)
+            frame, stale = RESULT_CACHE.get(key)
+            if frame is None:
+                # Concurrent sessions asking for the same result wait on one execution
+                frame = IN_FLIGHT.do(key, lambda: load(self, key, *args, **kwargs))
+            elif stale and getattr(_REVALIDATING, "depth", 0):
+                # Read while computing another result, which must not be built from stale data
+                frame = IN_FLIGHT.do(key, lambda: load(self, key, *args, **kwargs))
+            elif stale and not IN_FLIGHT.busy(key):
+                # Serve the last good result and recompute it off the request path
+                refresh = _REFRESH_EXECUTOR.submit(IN_FLIGHT.do, key, lambda: load(self, key, *args, **kwargs))
+                refresh.add_done_callback(_log_failure)
+            # Pages add columns to the frames they receive, so never hand out the shared copy
+            return frame.copy()
+
+        def refresh(self, *args, **kwargs):
+            key = method_key(self, args, kwargs)
+            return IN_FLIGHT.do(key, lambda: load(self, key, *args, **kwargs)).copy()
+
+        wrapper.tables = tables
+        wrapper.refresh = refresh
+        return wrapper
+    return decorator
+
+
+def _log_failure(future):
+    # A failed background refresh keeps serving the last good result
+    if future.exception() is not None:
+        logger.warning("Background refresh failed", exc_info=future.exception())
+
+
+def invalidate(table: str):
+    """Manual invalidation hook, call after reloading `table` in the warehouse"""
+    RESULT_CACHE.invalidate(table)
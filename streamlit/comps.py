@@ -0,0 +1,137 @@
+"""
+Comparable listings: the k listings most similar to a given one in location and features.
+
+Locations are points on a sphere with the earth's radius in kilometres, so the straight-line distance
+between two listings orders them exactly like the haversine distance. Room type, bedrooms, accommodates
+and rating are added as further coordinates, standardized and weighted in kilometres: a listing one
+standard deviation away in bedrooms counts as FEATURE_KM['BEDROOMS'] km farther. One KD-tree over these
+coordinates answers nearest-neighbour queries in milliseconds. It is built once per data load and
+pickled to disk under a hash of the listings, so restarts load it instead of rebuilding it.
+"""
+import hashlib
+import os
+import pickle
+from glob import glob
+from os.path import join
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0
+
+# How many kilometres of distance a difference of one standard deviation (or another room type) is worth
+FEATURE_KM = {
+    'ROOM_TYPE': 5.0,
+    'BEDROOMS': 1.0,
+    'ACCOMMODATES': 1.0,
+    'REVIEW_SCORES_RATING': 0.5,
+}
+NUMERIC_FEATURES = ['BEDROOMS', 'ACCOMMODATES', 'REVIEW_SCORES_RATING']
+
+DEFAULT_COMPS = 10
+
+
+def sphere(latitudes, longitudes) -> np.ndarray:
+    """Points on a sphere of the earth's radius, in kilometres"""
+    latitudes, longitudes = np.radians(np.asarray(latitudes, dtype=float)), np.radians(np.asarray(longitudes, dtype=float))
+    return EARTH_RADIUS_KM * np.column_stack([
+        np.cos(latitudes) * np.cos(longitudes),
+        np.cos(latitudes) * np.sin(longitudes),
+        np.sin(latitudes),
+    ])
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes) -> np.ndarray:
+    """Great-circle distances from one point to many, in kilometres"""
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    latitudes, longitudes = np.radians(np.asarray(latitudes, dtype=float)), np.radians(np.asarray(longitudes, dtype=float))
+    a = np.sin((latitudes - latitude) / 2) ** 2 + np.cos(latitude) * np.cos(latitudes) * np.sin((longitudes - longitude) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def frame_version(frame: pd.DataFrame) -> str:
+    """Hash of a frame's contents, which names the index built from it"""
+    return hashlib.sha256(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes()).hexdigest()[:16]
+
+
+class ComparablesIndex:
+    """KD-tree over the listings of `frame` (LISTING_ID, LATITUDE, LONGITUDE, ROOM_TYPE, the numeric features and PRICE)"""
+
+    def __init__(self, frame: pd.DataFrame):
+        located = frame['LATITUDE'].notna() & frame['LONGITUDE'].notna()
+        self.listings = frame[located].reset_index(drop=True)
+        self.room_types = sorted(self.listings['ROOM_TYPE'].dropna().unique())
+        numeric = self.listings[NUMERIC_FEATURES].astype(float)
+        # Missing features count as typical ones
+        self.centers = numeric.median().fillna(0.0)
+        self.scales = numeric.std().replace(0, np.nan).fillna(1.0)
+        self.tree = cKDTree(self._coordinates(
+            self.listings['LATITUDE'], self.listings['LONGITUDE'], self.listings['ROOM_TYPE'], numeric
+        ))
+
+    def _coordinates(self, latitudes, longitudes, room_types, numeric: pd.DataFrame) -> np.ndarray:
+        # Listings of two different room types end up FEATURE_KM['ROOM_TYPE'] km apart
+        room_types = np.asarray(room_types, dtype=object)
+        one_hot = np.column_stack([room_types == room_type for room_type in self.room_types]).astype(float) \
+            if self.room_types else np.zeros((len(room_types), 0))
+        scaled = ((numeric - self.centers) / self.scales).fillna(0.0).to_numpy()
+        weights = np.array([FEATURE_KM[column] for column in NUMERIC_FEATURES])
+        return np.hstack([
+            sphere(latitudes, longitudes),
+            one_hot * FEATURE_KM['ROOM_TYPE'] / np.sqrt(2),
+            scaled * weights,
+        ])
+
+    def query(self, latitude: float, longitude: float, room_type: str = None, bedrooms: float = None,
+              accommodates: float = None, rating: float = None, k: int = DEFAULT_COMPS, exclude=None) -> pd.DataFrame:
+        """The k most comparable listings, closest first, with their distance in km; `exclude` is a listing id to skip"""
+        numeric = pd.DataFrame([[bedrooms, accommodates, rating]], columns=NUMERIC_FEATURES, dtype=float)
+        point = self._coordinates([latitude], [longitude], [room_type], numeric)[0]
+        count = min(k + (exclude is not None), len(self.listings))
+        if count == 0:
+            return self.listings.iloc[:0].assign(DISTANCE_KM=[], SIMILARITY=[])
+        similarity, rows = self.tree.query(point, k=count)
+        comps = self.listings.iloc[np.atleast_1d(rows)].assign(SIMILARITY=np.atleast_1d(similarity))
+        if exclude is not None:
+            comps = comps[comps['LISTING_ID'] != exclude]
+        comps = comps.head(k)
+        comps.insert(len(comps.columns) - 1, 'DISTANCE_KM', haversine_km(latitude, longitude, comps['LATITUDE'], comps['LONGITUDE']))
+        return comps.reset_index(drop=True)
+
+    def comparables_of(self, listing_id, k: int = DEFAULT_COMPS) -> pd.DataFrame:
+        """The k listings most comparable to listing `listing_id`, without itself"""
+        matches = self.listings[self.listings['LISTING_ID'] == listing_id]
+        if matches.empty:
+            raise KeyError(f"No located listing with id {listing_id}")
+        row = matches.iloc[0]
+        return self.query(row['LATITUDE'], row['LONGITUDE'], row['ROOM_TYPE'], row['BEDROOMS'],
+                          row['ACCOMMODATES'], row['REVIEW_SCORES_RATING'], k, exclude=listing_id)
+
+
+def load_or_build(directory: str, frame: pd.DataFrame, version: str = None) -> tuple:
+    """
+    (version, index) for `frame`: loaded from `directory` if it was already built from the same listings,
+    built and written there otherwise. Indexes of earlier versions are removed.
+    """
+    version = version or frame_version(frame)
+    path = join(directory, f"{version}.pkl")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return version, pickle.load(f)
+
+    index = ComparablesIndex(frame)
+    os.makedirs(directory, exist_ok=True)
+    # Written under a temporary name first, so a concurrent reader never sees half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+    for stale in glob(join(directory, "*.pkl")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                # Another process cleaned it up first
+                pass
+    return version, index
@@ -1,253 +1,853 @@
 from snowflake import connector
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from os.path import join
+import atexit
+import duckdb
+import hashlib
 import os 
+import re
+import threading
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
+from aggregates import GRANULARITIES, CommunityPriceAggregate, DailyPriceAggregate, IncrementalAggregate, pick_granularity, pyramid, roll_up, truncate_dates
+from amenities import AmenityIndex, build_bitmaps, listings_version, parse_amenities
+from artifacts import ARTIFACTS
+from comps import ComparablesIndex, load_or_build
+from geometry import ASSIGNMENT_STATUSES, assign_communities, geometry_frame
+from hedonic import amenity_effects
+from hexgrid import DEFAULT_HEX_SIZE, hex_grid
+from histograms import histogram_in_memory, summary_in_memory
+from cache import IN_FLIGHT, RESULT_CACHE, cached
+from metrics import AMENITY_METRICS, REGISTERED, FusedQuery, MetricRequest, table_of
+from pool import ConnectionPool
+from topology import topology_levels
+from precompute import open_bundle, read_bundle_file
+from refresh import start_scheduler
 
-class SnowflakeConnector:
-    def __init__(self):
-        self.user = os.getenv("SNOWFLAKE_USER")
-        self.password = os.getenv("SNOWFLAKE_PASSWORD")
-        self.account = os.getenv("SNOWFLAKE_ACCOUNT")
-        self.database = os.getenv("SNOWFLAKE_DATABASE")
-        self.schema = os.getenv("SNOWFLAKE_SCHEMA")
-        
-        self.connection = self.connect()
-        
-    def __dict__(self):
+# Process-wide pools shared by every page, rerun and browser session, one per backend
+_POOLS = {}
+_POOL_LOCK = threading.Lock()
+
+# In-memory DuckDB databases holding the views over local files, (database, view sources) per data directory
+_LOCAL_DATABASES = {}
+_LOCAL_LOCK = threading.Lock()
+
+# Incrementally maintained aggregates, one per backend
+_AGGREGATES = {}
+
+# Comparable-listings index in memory, (version, index) per backend
+_COMPARABLES = {}
+
+# Amenity index in memory, (listings version, index) per backend
+_AMENITY_INDEXES = {}
+
+# Runs the queries a page declares up front concurrently, each worker borrows its own pooled connection
+_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("QUERY_WORKERS", 8)), thread_name_prefix="query")
+
+# Tables every backend has to provide
+TABLES = ["listings", "calendar", "reviews", "communities"]
+
+# Retrieval methods that back the pages
+DATASET_PREFIXES = ("retrieve_", "srishti_query_", "suhas_query_")
+
+# The review series starts after 2022-09-10; open range ends are bound as these dates
+REVIEWS_START = "2022-09-11"
+END_OF_TIME = "9999-12-31"
+
+
+class DataConnector:
+    """Retrieval methods shared by every backend; subclasses provide the connection and SQL dialect"""
+    
+    def connect(self):
+        raise NotImplementedError
+    
+    def pool_options(self) -> dict:
+        return {}
+    
+    def close(self):
+        """Connections belong to the shared pool, so only idle ones past their timeout are closed here"""
+        self.pool.evict_idle()
+    
+    def backend_key(self) -> str:
+        """Names the process-wide state of this backend: its pool, cached results, aggregates and indexes"""
+        return type(self).__name__
+    
+    def shared_pool(self) -> ConnectionPool:
+        """Returns the process-wide pool for this backend, creating it on first use"""
+        with _POOL_LOCK:
+            name = self.backend_key()
+            if name not in _POOLS:
+                _POOLS[name] = ConnectionPool(factory=self.connect, **self.pool_options())
+                atexit.register(_POOLS[name].close)
+            return _POOLS[name]
+    
+    def pool_stats(self) -> dict:
+        return self.pool.stats()
+    
+    def cache_stats(self) -> dict:
+        in_flight = IN_FLIGHT.stats()
         return {
-            "user": self.user,
-            "password": self.password,
-            "account": self.account,
-            "database": self.database,
-            "schema": self.schema
+            **RESULT_CACHE.stats(),
+            "query_executions": in_flight["executions"],
+            "coalesced_calls": in_flight["coalesced"],
         }
+    
+    def read_sql(self, query: str, params: dict = None) -> pd.DataFrame:
+        # Arrow buffers are handed to pandas without going through Python row tuples
+        return self.read_arrow(query, params).to_pandas(split_blocks=True, self_destruct=True)
+    
+    def read_arrow(self, query: str, params: dict = None) -> pa.Table:
+        """
+        Runs `query` on a pooled connection and returns the full result as an Arrow table.
         
-    def connect(self):
-        return connector.connect(**self.__dict__())
+        Bind parameters are written %(name)s in the query and passed in `params`.
+        """
+        raise NotImplementedError
     
-    def close(self):
-        self.connection.close()
+    def stream_batches(self, query: str, params: dict = None):
+        """Yields the result of `query` as Arrow record batches; the pooled connection is held until the generator is exhausted or closed"""
+        raise NotImplementedError
+    
+    def prefetch(self, *datasets) -> dict:
+        """
+        Submits retrieval methods to the query thread pool and returns {name: Future}.
+        
+        Each dataset is a method name, or a (name, kwargs) pair for methods that take parameters.
+        Pages call this before rendering and consume each future as its section renders.
+        """
+        futures = {}
+        for dataset in datasets:
+            name, kwargs = (dataset, {}) if isinstance(dataset, str) else dataset
+            futures[name] = _EXECUTOR.submit(getattr(self, name), **kwargs)
+        return futures
+    
+    @classmethod
+    def datasets(cls) -> list:
+        """Names of every page dataset, i.e. the retrieval methods that take no arguments"""
+        return [name for name in dir(cls) if name.startswith(DATASET_PREFIXES)]
+    
+    def table_versions(self) -> dict:
+        """{table: version string} that changes whenever a table's data is reloaded"""
+        raise NotImplementedError
+    
+    def change_marker(self, table: str) -> dict:
+        """JSON-serializable snapshot of `table` that earliest_change() later compares against"""
+        return {"version": self.table_versions()[table]}
+    
+    def earliest_change(self, table: str, column: str, marker: dict):
+        """
+        Smallest `column` value among the rows of `table` loaded since `marker` was taken, None if no row was.
+        
+        Raises when the backend cannot tell the changed rows apart; callers then treat every row as changed.
+        """
+        raise NotImplementedError
+    
+    def artifact(self, name: str) -> pd.DataFrame:
+        """Derived dataset computed from the retrieval methods, cached by the tables it reads (see artifacts.py)"""
+        return ARTIFACTS[name](self)
+    
+    # ---------------------------- SQL DIALECT ---------------------------- #
+    
+    def days_since(self, column: str) -> str:
+        """SQL expression for the number of days between `column` and today"""
+        return f"DATEDIFF(day, {column}, CURRENT_DATE())"
+    
+    def geometry_wkb(self, column: str) -> str:
+        """SQL expression for a GeoJSON text `column` as WKB"""
+        return f"ST_ASWKB(TO_GEOGRAPHY({column}))"
     
     # ---------------------------- RETRIEVAL METHODS ---------------------------- #
     
-    def retrieve_price_over_time(self) -> pd.DataFrame:
-        # Used to plot the price over time
-        query = """
-        SELECT date, AVG(price) AS avg_price
-        FROM calendar
-        GROUP BY date
-        ORDER BY date;
+    @cached("calendar")
+    def retrieve_price_over_time(self, start: str = None, end: str = None, granularity: str = "day") -> pd.DataFrame:
+        # Used to plot the price over time, read from the small daily aggregate instead of the calendar table
+        daily = self.retrieve_daily_price_aggregate().sort_values('DATE', ignore_index=True)
+        if start is None and end is None and granularity == "day":
+            return pd.DataFrame({'DATE': daily['DATE'], 'AVG_PRICE': daily['PRICE_SUM'] / daily['PRICE_COUNT']})
+        # Sums and counts roll up exactly, the average of a period is weighted by its listing-days
+        periods = roll_up(daily, start, end, granularity, ['PRICE_SUM', 'PRICE_COUNT'])
+        return pd.DataFrame({'DATE': periods['DATE'], 'AVG_PRICE': periods['PRICE_SUM'] / periods['PRICE_COUNT']})
+    
+    def retrieve_daily_price_aggregate(self) -> pd.DataFrame:
+        # Price sum/count/min/max and availability per date, re-aggregated from the earliest date a calendar load touched
+        return self.daily_price_aggregate().update(self)
+    
+    def daily_price_aggregate(self) -> DailyPriceAggregate:
+        """The process-wide daily price aggregate of this backend"""
+        return _aggregate(DailyPriceAggregate, f"daily_price_{self.backend_key()}")
+    
+    def community_price_aggregate(self) -> CommunityPriceAggregate:
+        """The process-wide per-community daily price aggregate of this backend"""
+        return _aggregate(CommunityPriceAggregate, f"community_price_{self.backend_key()}")
+    
+    @cached("reviews")
+    def retrieve_reviews(self, start: str = None, end: str = None, granularity: str = "day") -> pd.DataFrame:
+        # Used to plot the review count over time, the range is bound so each granularity is one reusable statement
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}', expected one of {list(GRANULARITIES)}")
+        period = "date" if granularity == "day" else f"DATE_TRUNC('{granularity}', date)"
+        query = f"""
+        SELECT {period} AS date, count(review_id) AS number_of_review
+        FROM reviews
+        WHERE date >= CAST(%(start)s AS DATE) AND date <= CAST(%(end)s AS DATE)
+        GROUP BY 1
+        ORDER BY 1;
         """
-        return pd.read_sql(query, self.connection)
+        return self.read_sql(query, {"start": start or REVIEWS_START, "end": end or END_OF_TIME})
     
-    def retrieve_reviews(self) -> pd.DataFrame:
-        # Used to plot the review count over time
+    @cached("calendar", "reviews")
+    def retrieve_date_bounds(self) -> pd.DataFrame:
+        # First and last date of each time series for the date pickers; Snowflake answers MIN/MAX from metadata
+        reviews = self.read_sql("SELECT MIN(date) AS min_date, MAX(date) AS max_date FROM reviews;")
+        prices = pd.to_datetime(self.retrieve_daily_price_aggregate()['DATE'])
+        return pd.DataFrame({
+            'SERIES': ['price', 'reviews'],
+            'MIN_DATE': [prices.min(), max(pd.Timestamp(reviews['MIN_DATE'][0]), pd.Timestamp(REVIEWS_START))],
+            'MAX_DATE': [prices.max(), pd.Timestamp(reviews['MAX_DATE'][0])],
+        })
+    
+    @cached("calendar", "listings", "communities")
+    def retrieve_price_rollups(self) -> pd.DataFrame:
+        # Price sums and counts per day, week, month and quarter, for the whole city (null COMMUNITY_ID) and per community,
+        # both from aggregates that only re-read the calendar dates a load touched and the listings that moved community
+        city = self.retrieve_daily_price_aggregate()[['DATE', 'PRICE_SUM', 'PRICE_COUNT']]
+        city.insert(0, 'COMMUNITY_ID', np.nan)
+        assignment = self.retrieve_listing_communities().set_index('LISTING_ID')['COMMUNITY_ID']
+        communities = self.community_price_aggregate().update(self, assignment)
+        return pyramid(pd.concat([city, communities], ignore_index=True), ['PRICE_SUM', 'PRICE_COUNT'], by=['COMMUNITY_ID'])
+    
+    @cached("reviews", "listings", "communities")
+    def retrieve_review_rollups(self) -> pd.DataFrame:
+        # Review counts per day, week, month and quarter, for the whole city (null COMMUNITY_ID) and per community,
+        # by the community each listing's coordinates fall in
         query = """
-        SELECT date, count(review_id) AS number_of_review
+        SELECT listing_id, date, COUNT(review_id) AS number_of_review
         FROM reviews
-        WHERE date > TO_DATE('2022-09-10', 'YYYY-MM-DD') 
-        GROUP BY date
-        ORDER BY date;
+        WHERE date >= CAST(%(start)s AS DATE)
+        GROUP BY listing_id, date;
+        """
+        city = self.retrieve_reviews()
+        city.insert(0, 'COMMUNITY_ID', np.nan)
+        reviews = self.read_sql(query, {"start": REVIEWS_START})
+        assignment = self.retrieve_listing_communities().set_index('LISTING_ID')['COMMUNITY_ID']
+        reviews['COMMUNITY_ID'] = reviews['LISTING_ID'].map(assignment)
+        communities = reviews.groupby(['COMMUNITY_ID', 'DATE'])['NUMBER_OF_REVIEW'].sum().reset_index()
+        return pyramid(pd.concat([city, communities], ignore_index=True), ['NUMBER_OF_REVIEW'], by=['COMMUNITY_ID'])
+    
+    def series(self, name: str, start, end, community_id=None, granularity: str = None) -> tuple:
         """
-        return pd.read_sql(query, self.connection)
+        (frame, granularity) of the 'price' or 'reviews' series between start and end, for the whole city or one
+        community, sliced from the precomputed rollups. Without a granularity, the coarsest one with enough points is used.
+        """
+        rollups = self.retrieve_price_rollups() if name == "price" else self.retrieve_review_rollups()
+        # Pick the granularity on the part of the range that has data
+        days = pd.to_datetime(rollups.loc[rollups['GRANULARITY'] == "day", 'DATE'])
+        start, end = max(pd.Timestamp(start), days.min()), min(pd.Timestamp(end), days.max())
+        granularity = granularity or pick_granularity(start, end)
+        rows = rollups[rollups['GRANULARITY'] == granularity]
+        rows = rows[rows['COMMUNITY_ID'].isna()] if community_id is None else rows[rows['COMMUNITY_ID'] == community_id]
+        # Keep the period the start date falls in, even when the period began earlier
+        first = truncate_dates(pd.Series([start]), granularity)[0]
+        dates = pd.to_datetime(rows['DATE'])
+        rows = rows[(dates >= first) & (dates <= end)].sort_values('DATE', ignore_index=True)
+        if name == "price":
+            return pd.DataFrame({'DATE': rows['DATE'], 'AVG_PRICE': rows['PRICE_SUM'] / rows['PRICE_COUNT']}), granularity
+        return rows[['DATE', 'NUMBER_OF_REVIEW']], granularity
     
+    @cached("communities", "listings")
     def retrieve_community_data(self) -> pd.DataFrame:
+        # Listing statistics of every community with listings, by the community each listing's coordinates fall in
+        communities = self.read_sql("SELECT community_id, name, crime_rate FROM communities;")
+        listings = self.read_sql("SELECT listing_id, price, number_of_reviews, review_scores_rating FROM listings;")
+        listings = listings.merge(self.retrieve_listing_communities()[['LISTING_ID', 'COMMUNITY_ID']], on='LISTING_ID')
+        grouped = listings.astype({'PRICE': float, 'NUMBER_OF_REVIEWS': float, 'REVIEW_SCORES_RATING': float}).groupby('COMMUNITY_ID')
+        stats = pd.DataFrame({
+            'AVG_PRICE': grouped['PRICE'].mean().round(1),
+            'REVIEW_COUNT': grouped['NUMBER_OF_REVIEWS'].sum(),
+            'AVG_RATING': grouped['REVIEW_SCORES_RATING'].mean().round(2),
+        }).reset_index()
+        return communities.merge(stats, on='COMMUNITY_ID')
+    
+    @cached("communities")
+    def retrieve_community_geometry(self) -> pd.DataFrame:
+        # Boundaries as WKB with centroids, label points and bounding boxes, computed once per load (geometry.py)
+        query = f"""
+            SELECT community_id, {self.geometry_wkb('geometry')} AS geometry
+            FROM communities;
+        """
+        frame = self.read_sql(query)
+        return geometry_frame(frame['COMMUNITY_ID'], frame['GEOMETRY'])
+    
+    @cached("listings")
+    def retrieve_listing_locations(self) -> pd.DataFrame:
+        query = """
+            SELECT listing_id, longitude, latitude, community_id
+            FROM listings
+            ORDER BY listing_id;
+        """
+        return self.read_sql(query)
+    
+    @cached("listings", "communities")
+    def retrieve_listing_communities(self) -> pd.DataFrame:
+        # Community of every listing from its coordinates, reassigned whenever listings or boundaries are reloaded (geometry.py).
+        # IMPUTED_COMMUNITY_ID is the community_id stored on the listings table, kept for comparison
+        locations = self.retrieve_listing_locations()
+        geometry = self.retrieve_community_geometry()
+        assigned = assign_communities(locations['LONGITUDE'], locations['LATITUDE'], geometry['COMMUNITY_ID'], geometry['GEOMETRY'])
+        return pd.DataFrame({
+            'LISTING_ID': locations['LISTING_ID'],
+            'COMMUNITY_ID': assigned['COMMUNITY_ID'].astype('Int64'),
+            'STATUS': assigned['STATUS'],
+            'DISTANCE_M': assigned['DISTANCE_M'],
+            'IMPUTED_COMMUNITY_ID': locations['COMMUNITY_ID'].astype('Int64'),
+        })
+    
+    @cached("listings")
+    def retrieve_listing_points(self) -> pd.DataFrame:
+        query = """
+            SELECT listing_id, longitude, latitude, price, review_scores_rating
+            FROM listings;
+        """
+        return self.read_sql(query)
+    
+    @cached("listings")
+    def retrieve_hex_grid(self, size: int = DEFAULT_HEX_SIZE) -> pd.DataFrame:
+        # Listing count, price and rating per hexagon of `size` metres, binned in memory and cached per size (hexgrid.py)
+        points = self.retrieve_listing_points()
+        return hex_grid(points['LONGITUDE'], points['LATITUDE'], points['PRICE'], points['REVIEW_SCORES_RATING'], size)
+    
+    @cached("listings")
+    def retrieve_listing_comps(self) -> pd.DataFrame:
         query = """
-            SELECT communities.COMMUNITY_ID, NAME, GEOMETRY, CRIME_RATE, avg_price
-            FROM communities INNER JOIN 
-                                    (SELECT COMMUNITY_ID, ROUND(AVG(price),1) AS avg_price
-                                    FROM listings
-                                    GROUP BY COMMUNITY_ID
-                                    ) AS subquery
-                                    ON communities.COMMUNITY_ID = subquery.COMMUNITY_ID
+            SELECT listing_id, latitude, longitude, room_type, bedrooms, accommodates, review_scores_rating, price
+            FROM listings
+            ORDER BY listing_id;
         """
-        return pd.read_sql(query, self.connection)
+        return self.read_sql(query)
+    
+    @cached("listings")
+    def retrieve_comparables_index(self) -> pd.DataFrame:
+        # Builds the comps index once per load of the listings (or loads the one already on disk) and names its version
+        listings = self.retrieve_listing_comps()
+        version, index = load_or_build(self.comparables_directory(), listings)
+        with _POOL_LOCK:
+            _COMPARABLES[self.backend_key()] = (version, index)
+        return pd.DataFrame({'VERSION': [version], 'LISTING_COUNT': [len(index.listings)]})
+    
+    def comparables_directory(self) -> str:
+        return join(RESULT_CACHE.directory, "comps", self.backend_key())
+    
+    def comparables_index(self) -> ComparablesIndex:
+        """KD-tree of comparable listings for the current listings, read from disk at most once per version (comps.py)"""
+        version = self.retrieve_comparables_index()['VERSION'][0]
+        with _POOL_LOCK:
+            entry = _COMPARABLES.get(self.backend_key())
+        if entry is None or entry[0] != version:
+            entry = load_or_build(self.comparables_directory(), self.retrieve_listing_comps(), version)
+            with _POOL_LOCK:
+                _COMPARABLES[self.backend_key()] = entry
+        return entry[1]
+    
+    def community_assignment_report(self) -> pd.DataFrame:
+        """Listings per assignment status, how many differ from the imputed community, and the farthest snap"""
+        listings = self.retrieve_listing_communities()
+        listings['CHANGED'] = (listings['COMMUNITY_ID'] != listings['IMPUTED_COMMUNITY_ID']).fillna(
+            listings['COMMUNITY_ID'].isna() != listings['IMPUTED_COMMUNITY_ID'].isna()
+        )
+        grouped = listings.groupby('STATUS')
+        return pd.DataFrame({
+            'LISTING_COUNT': grouped.size(),
+            'CHANGED': grouped['CHANGED'].sum(),
+            'MAX_DISTANCE_M': grouped['DISTANCE_M'].max(),
+        }).reindex([status for status in ASSIGNMENT_STATUSES if status in grouped.groups]).reset_index()
+    
+    @cached("communities")
+    def retrieve_community_topology(self) -> pd.DataFrame:
+        # TopoJSON of the boundaries simplified for each zoom range, the map picks the level in the browser (topology.py)
+        geometry = self.retrieve_community_geometry()
+        return topology_levels(geometry['COMMUNITY_ID'], geometry['GEOMETRY'])
 
     
     # ---------------------------- UNNAMED ---------------------------- #
-    # Queries from Sristi's analysis
+    # Queries from Sristi's analysis, all derived in memory from one host-level rollup of listings
     
-    def srishti_query_1(self) -> pd.DataFrame:
+    @cached("listings")
+    def retrieve_host_rollup(self) -> pd.DataFrame:
+        # One row per host, computed in a single scan of listings
         query = """
-            WITH HostListings AS (
-                SELECT
-                    host_id,
-                    COUNT(DISTINCT listing_id) AS listing_count,
-                    MAX(host_is_superhost) AS host_is_superhost_value
-                FROM
-                    listings
-                GROUP BY
-                    host_id
-            )
-
             SELECT
-                CASE
-                    WHEN listing_count = 1 THEN 'One Listing'
-                    ELSE 'Multiple Listings'
-                END AS listing_count_category,
-                COUNT(DISTINCT host_id) AS host_count,
-                SUM(host_is_superhost_value) AS host_is_superhost_count
+                host_id,
+                MAX(host_is_superhost) AS host_is_superhost,
+                MAX(host_has_profile_pic) AS host_has_profile_pic,
+                MAX(host_identity_verified) AS host_identity_verified,
+                COUNT(listing_id) AS listing_count,
+                COUNT(DISTINCT listing_id) AS distinct_listing_count,
+                SUM(CASE WHEN instant_bookable = 1 THEN 1 ELSE 0 END) AS instant_bookable_count,
+                SUM(CASE WHEN instant_bookable = 0 THEN 1 ELSE 0 END) AS not_instant_bookable_count,
+                AVG(REVIEWS_PER_MONTH) AS avg_reviews_per_month
             FROM
-                HostListings
+                listings
             GROUP BY
-                listing_count_category;
+                host_id;
         """
-        return pd.read_sql(query, self.connection)
+        return self.read_sql(query)
+    
+    def host_crosstab(self, index: str, columns: str) -> pd.DataFrame:
+        """Number of hosts by any two rollup columns, e.g. host_crosstab('HOST_IDENTITY_VERIFIED', 'HOST_HAS_PROFILE_PIC')"""
+        rollup = self.retrieve_host_rollup()
+        return pd.crosstab(rollup[index], rollup[columns])
+    
+    def _count_hosts(self, rollup: pd.DataFrame, by: list) -> pd.DataFrame:
+        # COUNT(DISTINCT host_id) ... GROUP BY `by`, keeping NULL groups like SQL does
+        return rollup.groupby(by, dropna=False)['HOST_ID'].nunique().reset_index(name='HOST_COUNT')
+    
+    def srishti_query_1(self) -> pd.DataFrame:
+        rollup = self.retrieve_host_rollup()
+        rollup['LISTING_COUNT_CATEGORY'] = np.where(rollup['DISTINCT_LISTING_COUNT'] == 1, 'One Listing', 'Multiple Listings')
+        return rollup.groupby('LISTING_COUNT_CATEGORY').agg(
+            HOST_COUNT=('HOST_ID', 'nunique'),
+            HOST_IS_SUPERHOST_COUNT=('HOST_IS_SUPERHOST', 'sum'),
+        ).reset_index()
     
     def srishti_query_2(self) -> pd.DataFrame:
-        query="""
-            SELECT
-                listing_count,
-                COUNT(host_id) AS host_count
-            FROM (
-                SELECT
-                    host_id,
-                    COUNT(listing_id) AS listing_count
-                FROM
-                    listings
-                GROUP BY
-                    host_id
-            ) AS HostListings
-            GROUP BY
-                listing_count
-            ORDER BY
-                listing_count;
-        """
-        return pd.read_sql(query, self.connection)
+        rollup = self.retrieve_host_rollup()
+        return rollup.groupby('LISTING_COUNT')['HOST_ID'].count().reset_index(name='HOST_COUNT').sort_values('LISTING_COUNT', ignore_index=True)
     
     def srishti_query_3(self) -> pd.DataFrame:
-        query="""
-            SELECT
-                HOST_HAS_PROFILE_PIC,
-                host_is_superhost,
-                COUNT(DISTINCT host_id) AS host_count
-            FROM
-                listings
-            GROUP BY
-                HOST_HAS_PROFILE_PIC, host_is_superhost;
-        """
-        return pd.read_sql(query, self.connection)
+        return self._count_hosts(self.retrieve_host_rollup(), ['HOST_HAS_PROFILE_PIC', 'HOST_IS_SUPERHOST'])
     
     def srishti_query_4(self) -> pd.DataFrame:
-        query="""
-            SELECT
-                HOST_IDENTITY_VERIFIED,
-                host_is_superhost,
-                COUNT(DISTINCT host_id) AS host_count
-            FROM
-                listings
-            GROUP BY
-                HOST_IDENTITY_VERIFIED, host_is_superhost;
-        """
-        return pd.read_sql(query, self.connection)
+        return self._count_hosts(self.retrieve_host_rollup(), ['HOST_IDENTITY_VERIFIED', 'HOST_IS_SUPERHOST'])
     
     def srishti_query_5(self) -> pd.DataFrame:
-        query="""
-            SELECT
-                INSTANT_BOOKABLE,
-                host_is_superhost,
-                COUNT(DISTINCT host_id) AS host_count
-            FROM
-                listings
-            GROUP BY
-                INSTANT_BOOKABLE, host_is_superhost;
-        """
-        return pd.read_sql(query, self.connection)
+        rollup = self.retrieve_host_rollup()
+        # A host with both kinds of listings is counted in both groups, as with the listing-level GROUP BY
+        hosts = pd.concat([
+            rollup[rollup['INSTANT_BOOKABLE_COUNT'] > 0].assign(INSTANT_BOOKABLE=1),
+            rollup[rollup['NOT_INSTANT_BOOKABLE_COUNT'] > 0].assign(INSTANT_BOOKABLE=0),
+        ])
+        return self._count_hosts(hosts, ['INSTANT_BOOKABLE', 'HOST_IS_SUPERHOST'])
     
     def srishti_query_6(self) -> pd.DataFrame:
-        query="""
-            SELECT
-                host_id,
-                host_is_superhost,
-                AVG(REVIEWS_PER_MONTH) AS avg_reviews_per_month
-            FROM
-                listings
-            GROUP BY
-                host_id, host_is_superhost;
+        return self.retrieve_host_rollup()[['HOST_ID', 'HOST_IS_SUPERHOST', 'AVG_REVIEWS_PER_MONTH']]
+    
+    def host_histogram(self, measure: str = "AVG_REVIEWS_PER_MONTH", bins: int = 30, method: str = "fixed",
+                       low: float = None, high: float = None) -> pd.DataFrame:
+        """
+        Number of hosts per bin of a host-level measure and superhost flag, binned in memory from the host rollup (see histograms.py).
+        Fixed edges span low to high, defaulting to the measure's range; hosts outside them are left out.
         """
-        return pd.read_sql(query, self.connection)
+        return histogram_in_memory(self.retrieve_host_rollup(), measure, bins, method, low, high)
+    
+    def host_summary(self, measure: str = "AVG_REVIEWS_PER_MONTH") -> pd.DataFrame:
+        """Count, mean, standard deviation and quartiles of a host-level measure per superhost flag"""
+        return summary_in_memory(self.retrieve_host_rollup(), measure)
+    
+    # Queries from Suhas's analysis; the listings price metrics come from the metric registry (metrics.py)
+    
+    @cached("listings")
+    def retrieve_listing_metrics(self) -> pd.DataFrame:
+        # Every registered listings metric request, fused into a single scan
+        return self.read_sql(FusedQuery("listings", REGISTERED.values()).sql)
+    
+    def metric_frame(self, name: str) -> pd.DataFrame:
+        """Result of the registered metric request `name`, split out of the fused listings metrics"""
+        return FusedQuery("listings", REGISTERED.values()).split(self.retrieve_listing_metrics(), REGISTERED[name])
+    
+    def metrics(self, *requests: MetricRequest) -> list:
+        """Answers ad hoc metric requests with one fused query per table, in the order given"""
+        queries = {table: FusedQuery(table, requests) for table in {table_of(request) for request in requests}}
+        frames = {table: self.read_sql(query.sql) for table, query in queries.items()}
+        return [queries[table_of(request)].split(frames[table_of(request)], request) for request in requests]
     
     def suhas_query_1(self) -> pd.DataFrame:
-        query = """
-            SELECT 
-                host_neighbourhood AS neighbourhood, 
-                AVG(price) AS average_price,
-                MIN(price) AS min_price,
-                MAX(price) AS max_price,
-                STDDEV(price) AS std_deviation
-            FROM 
-                LISTINGS
-            GROUP BY 
-                neighbourhood, 
-                room_type;
-        """
-        return pd.read_sql(query, self.connection)
+        # Grouped by neighbourhood and room type, but only the neighbourhood is shown
+        return self.metric_frame("suhas_query_1").drop(columns='ROOM_TYPE')
     
     def suhas_query_2(self) -> pd.DataFrame:
-        query = """
-            SELECT 
-                AVG(price) AS average_price, 
-                AVG(number_of_reviews) AS average_reviews
-            FROM 
-                LISTINGS
-            GROUP BY 
-                host_neighbourhood;
-        """
-        return pd.read_sql(query, self.connection)
+        return self.metric_frame("suhas_query_2").drop(columns='NEIGHBOURHOOD')
     
     def suhas_query_3(self) -> pd.DataFrame:
-        query = """
+        return self.metric_frame("suhas_query_3").sort_values('AVERAGE_PRICE', ascending=False, ignore_index=True)
+    
+    def suhas_query_4(self) -> pd.DataFrame:
+        # Average price with each amenity, from the amenity bitmaps instead of a LIKE scan of the JSON per amenity
+        index = self.amenity_index()
+        averages = {
+            name.upper(): index.select([amenity])['AVERAGE_PRICE'] if amenity in index.names else np.nan
+            for name, amenity in AMENITY_METRICS.items()
+        }
+        return pd.DataFrame([{**averages, 'OVERALL_AVG_PRICE': index.select([])['AVERAGE_PRICE']}])
+    
+    def suhas_query_5(self) -> pd.DataFrame:
+        return self.metric_frame("suhas_query_5").drop(columns='NEIGHBOURHOOD')
+    
+    def retrieve_neighbourhood_summary(self) -> pd.DataFrame:
+        # Price, listing count, reviews and ratings per neighbourhood, small enough to filter in the browser
+        return self.metric_frame("neighbourhood_summary")
+    
+    @cached("listings")
+    def suhas_query_6(self) -> pd.DataFrame:
+        query = f"""
             SELECT 
-                room_type, 
+                {self.days_since('host_since')} AS days_as_host,
                 AVG(price) AS average_price,
-                COUNT(*) AS number_of_listings
+                COUNT(price) AS listing_count,
+                SUM(price) AS price_sum
             FROM 
                 LISTINGS
             GROUP BY 
-                room_type
-            ORDER BY 
-                average_price DESC;
+                days_as_host;
         """
-        return pd.read_sql(query, self.connection)
+        return self.read_sql(query)
     
-    def suhas_query_4(self) -> pd.DataFrame:
+    # ---------------------------- AMENITIES ---------------------------- #
+    # The amenities JSON is parsed once into a dictionary and per-amenity bitmaps (amenities.py)
+    
+    @cached("listings")
+    def retrieve_listing_amenities(self) -> pd.DataFrame:
         query = """
-            SELECT 
-                AVG(CASE WHEN amenities LIKE '%"Wifi"%' THEN price ELSE NULL END) AS wifi,
-                AVG(CASE WHEN amenities LIKE '%"Air conditioning"%' THEN price ELSE NULL END) AS air_conditioning,
-                AVG(CASE WHEN amenities LIKE '%"Pool"%' THEN price ELSE NULL END) AS pool,
-                AVG(CASE WHEN amenities LIKE '%"Bathtub"%' THEN price ELSE NULL END) AS bathtub,
-                AVG(CASE WHEN amenities LIKE '%"Central heating"%' THEN price ELSE NULL END) AS central_heating,
-                AVG(CASE WHEN amenities LIKE '%"Free parking on premises"%' THEN price ELSE NULL END) AS free_parking,
-                AVG(CASE WHEN amenities LIKE '%"Free street parking"%' THEN price ELSE NULL END) AS free_street_parking,
-                AVG(price) AS overall_avg_price
-            FROM 
-                LISTINGS;
+            SELECT listing_id, price, amenities
+            FROM listings
+            ORDER BY listing_id;
         """
-        return pd.read_sql(query, self.connection)
+        return self.read_sql(query)
     
-    def suhas_query_5(self) -> pd.DataFrame:
-        query = """
-            SELECT
-                AVG(price) AS average_price,
-                AVG(review_scores_rating) AS average_overall_rating,
-                AVG(review_scores_cleanliness) AS average_cleanliness_rating,
-                AVG(review_scores_location) AS average_location_rating
-            FROM 
-                LISTINGS
-            GROUP BY 
-                host_neighbourhood;
+    @cached("listings")
+    def retrieve_amenity_bitmaps(self) -> pd.DataFrame:
+        # Bit i of every bitmap is row i of retrieve_listing_amenities, whose version is kept alongside
+        listings = self.retrieve_listing_amenities()
+        bitmaps = build_bitmaps(parse_amenities(listings['AMENITIES']))
+        bitmaps['LISTINGS_VERSION'] = listings_version(listings['LISTING_ID'], listings['AMENITIES'])
+        return bitmaps
+    
+    @cached("listings")
+    def retrieve_amenity_index(self) -> pd.DataFrame:
+        # Builds the amenity index once per load of the listings and names it by the table's version, so reruns
+        # find it in memory instead of hashing the listings again
+        version = self.table_versions()["listings"]
+        index = self._build_amenity_index()
+        with _POOL_LOCK:
+            _AMENITY_INDEXES[self.backend_key()] = (version, index)
+        return pd.DataFrame({'VERSION': [version], 'LISTING_COUNT': [len(index.prices)]})
+    
+    def amenity_index(self) -> AmenityIndex:
+        """Average price, count and price lift of any amenity selection, built at most once per listings version"""
+        version = self.retrieve_amenity_index()['VERSION'][0]
+        with _POOL_LOCK:
+            entry = _AMENITY_INDEXES.get(self.backend_key())
+        if entry is None or entry[0] != version:
+            # The version came from the result cache of an earlier process, or the index is being rebuilt
+            entry = (version, self._build_amenity_index())
+            with _POOL_LOCK:
+                _AMENITY_INDEXES[self.backend_key()] = entry
+        return entry[1]
+    
+    def _build_amenity_index(self) -> AmenityIndex:
+        listings = self.retrieve_listing_amenities()
+        bitmaps = self.retrieve_amenity_bitmaps()
+        version = listings_version(listings['LISTING_ID'], listings['AMENITIES'])
+        if len(listings) and (bitmaps.empty or bitmaps['LISTINGS_VERSION'][0] != version):
+            # Cached apart from the listings, and not yet rebuilt from the ones just read
+            bitmaps = type(self).retrieve_amenity_bitmaps.refresh(self)
+            if bitmaps.empty or bitmaps['LISTINGS_VERSION'][0] != version:
+                # The listings were reloaded again in between, parse the ones just read
+                bitmaps = build_bitmaps(parse_amenities(listings['AMENITIES']))
+        return AmenityIndex(listings['PRICE'], bitmaps)
+    
+    @cached("listings", "communities")
+    def retrieve_listing_features(self) -> pd.DataFrame:
+        # Room type and community name of every listing, by the community its coordinates fall in
+        listings = self.read_sql("SELECT listing_id, room_type FROM listings ORDER BY listing_id;")
+        names = self.read_sql("SELECT community_id, name AS community FROM communities;")
+        assignment = self.retrieve_listing_communities()[['LISTING_ID', 'COMMUNITY_ID']]
+        features = listings.merge(assignment, on='LISTING_ID', how='left')
+        names['COMMUNITY_ID'] = names['COMMUNITY_ID'].astype('Int64')
+        return features.merge(names, on='COMMUNITY_ID', how='left')[['LISTING_ID', 'ROOM_TYPE', 'COMMUNITY']]
+    
+    @cached("listings", "communities")
+    def retrieve_amenity_effects(self) -> pd.DataFrame:
+        # Price effect of every amenity holding room type and community fixed (hedonic.py), refit when either table changes
+        index = self.amenity_index()
+        listing_ids = self.retrieve_listing_amenities()['LISTING_ID']
+        features = self.retrieve_listing_features().set_index('LISTING_ID').reindex(listing_ids)
+        categoricals = {'room_type': features['ROOM_TYPE'], 'community': features['COMMUNITY']}
+        return amenity_effects(index.prices, index.bits, index.names, categoricals)
+
+
+def _aggregate(kind: type, name: str) -> IncrementalAggregate:
+    with _POOL_LOCK:
+        if name not in _AGGREGATES:
+            _AGGREGATES[name] = kind(join(RESULT_CACHE.directory, "aggregates"), name)
+        return _AGGREGATES[name]
+
+
+class SnowflakeConnector(DataConnector):
+    def __init__(self):
+        self.user = os.getenv("SNOWFLAKE_USER")
+        self.password = os.getenv("SNOWFLAKE_PASSWORD")
+        self.account = os.getenv("SNOWFLAKE_ACCOUNT")
+        self.database = os.getenv("SNOWFLAKE_DATABASE")
+        self.schema = os.getenv("SNOWFLAKE_SCHEMA")
+        
+        self.pool = self.shared_pool()
+        
+    def __dict__(self):
+        return {
+            "user": self.user,
+            "password": self.password,
+            "account": self.account,
+            "database": self.database,
+            "schema": self.schema
+        }
+        
+    def connect(self):
+        # qmark parameters are bound on the server, the pyformat default would inline them into the statement text
+        return connector.connect(**self.__dict__(), paramstyle="qmark")
+    
+    def read_arrow(self, query: str, params: dict = None) -> pa.Table:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(*self.bind(query, params))
+                table = cursor.fetch_arrow_all()
+                if table is None:
+                    # The connector returns None instead of an empty table when there are no rows
+                    table = pa.table({column[0]: pa.array([], pa.null()) for column in cursor.description})
+                return table
+            finally:
+                cursor.close()
+    
+    def stream_batches(self, query: str, params: dict = None):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(*self.bind(query, params))
+                for table in cursor.fetch_arrow_batches():
+                    yield from table.to_batches()
+            finally:
+                cursor.close()
+    
+    def bind(self, query: str, params: dict = None) -> tuple:
+        # Every range of a query sends the same statement text, which Snowflake compiles once and reuses
+        if not params:
+            return (query,)
+        names = re.findall(r"%\((\w+)\)s", query)
+        return (re.sub(r"%\((\w+)\)s", "?", query), [params[name] for name in names])
+    
+    def table_versions(self) -> dict:
+        tables = ", ".join(f"'{table.upper()}'" for table in TABLES)
+        query = f"""
+            SELECT table_name, row_count, last_altered
+            FROM information_schema.tables
+            WHERE table_schema = CURRENT_SCHEMA() AND table_name IN ({tables});
         """
-        return pd.read_sql(query, self.connection)
+        frame = self.read_sql(query)
+        return {
+            row.TABLE_NAME.lower(): f"{row.ROW_COUNT}@{row.LAST_ALTERED}"
+            for row in frame.itertuples(index=False)
+        }
     
-    def suhas_query_6(self) -> pd.DataFrame:
-        query = """
-            SELECT 
-                DATEDIFF(day, host_since, CURRENT_DATE()) AS days_as_host,
-                AVG(price) AS average_price
-            FROM 
-                LISTINGS
-            GROUP BY 
-                days_as_host;
+    def change_marker(self, table: str) -> dict:
+        at = self.read_sql("SELECT CURRENT_TIMESTAMP() AS at;")['AT'][0]
+        return {**super().change_marker(table), "at": pd.Timestamp(at).isoformat()}
+    
+    def earliest_change(self, table: str, column: str, marker: dict):
+        # Reads only the rows changed since the marker from the table's change tracking (CHANGE_TRACKING = TRUE);
+        # without it the statement fails and the caller rebuilds from scratch
+        query = f"""
+            SELECT MIN({column}) AS earliest
+            FROM {table} CHANGES(INFORMATION => DEFAULT) AT(TIMESTAMP => CAST(%(at)s AS TIMESTAMP_LTZ));
         """
-        return pd.read_sql(query, self.connection)
\ No newline at end of file
+        earliest = self.read_sql(query, {"at": marker["at"]})['EARLIEST'][0]
+        return None if pd.isna(earliest) else earliest
+    
+    def pool_options(self) -> dict:
+        return {
+            "max_size": int(os.getenv("SNOWFLAKE_POOL_SIZE", 4)),
+            "idle_timeout": float(os.getenv("SNOWFLAKE_POOL_IDLE_TIMEOUT", 300)),
+            "wait_timeout": float(os.getenv("SNOWFLAKE_POOL_WAIT_TIMEOUT", 30)),
+            "validate": lambda connection: not connection.is_closed(),
+            # Lost sessions and broken connections; SQL errors (ProgrammingError and the like) leave the session usable
+            "discard_on": (connector.errors.OperationalError, connector.errors.InterfaceError),
+        }
+
+
+class LocalConnector(DataConnector):
+    """Runs the same retrieval methods with DuckDB over local Parquet/CSV exports of the tables"""
+    
+    def __init__(self, data_dir: str = None):
+        self.data_dir = data_dir or os.getenv("LOCAL_DATA_DIR")
+        self.pool = self.shared_pool()
+    
+    def backend_key(self) -> str:
+        # Connectors over different directories must not share views, pools or cached results
+        directory = hashlib.sha1(os.path.abspath(self.data_dir).encode()).hexdigest()[:8]
+        return f"{type(self).__name__}_{directory}"
+    
+    def connect(self):
+        # Every pooled connection is a cursor on the directory's in-memory database, so the views are shared
+        return self.database().cursor()
+    
+    def database(self):
+        """In-memory DuckDB database of `data_dir` with a view per table, recreated where the exports moved or changed format"""
+        with _LOCAL_LOCK:
+            key = os.path.abspath(self.data_dir)
+            if key not in _LOCAL_DATABASES:
+                _LOCAL_DATABASES[key] = (duckdb.connect(":memory:"), {})
+            database, sources = _LOCAL_DATABASES[key]
+            for table in TABLES:
+                source = self.table_source(table)
+                if sources.get(table) != source:
+                    database.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM {source}")
+                    sources[table] = source
+            return database
+    
+    def table_patterns(self, table: str) -> list:
+        """Glob patterns of the exports of `table` that match any file, Parquet before CSV"""
+        for patterns in ([f"{table}.parquet", join(table, "*.parquet")], [f"{table}*.csv", join(table, "*.csv")]):
+            matching = [join(self.data_dir, pattern) for pattern in patterns if glob(join(self.data_dir, pattern))]
+            if matching:
+                return matching
+        raise FileNotFoundError(f"No Parquet or CSV export of '{table}' found in {self.data_dir}")
+    
+    def table_files(self, table: str) -> list:
+        """Every export of `table`, e.g. listings.parquet or reviews_1.csv, reviews_2.csv"""
+        return sorted(path for pattern in self.table_patterns(table) for path in glob(pattern))
+    
+    def table_source(self, table: str) -> str:
+        """DuckDB table function reading the exports of `table`"""
+        # Globbed by DuckDB on every query, so a new export chunk is read without recreating the view
+        patterns = self.table_patterns(table)
+        if patterns[0].endswith(".parquet"):
+            return f"read_parquet({patterns!r}, union_by_name = true)"
+        return f"read_csv_auto({patterns!r}, union_by_name = true)"
+    
+    def table_versions(self) -> dict:
+        # Recreates the views of tables whose exports moved or changed format, before the changes are refreshed
+        self.database()
+        versions = {}
+        for table in TABLES:
+            stats = [os.stat(path) for path in self.table_files(table)]
+            versions[table] = f"{sum(stat.st_size for stat in stats)}@{max(stat.st_mtime for stat in stats)}"
+        return versions
+    
+    def change_marker(self, table: str) -> dict:
+        stats = {path: os.stat(path) for path in self.table_files(table)}
+        files = {path: [stat.st_size, stat.st_mtime_ns] for path, stat in stats.items()}
+        return {**super().change_marker(table), "files": files}
+    
+    def earliest_change(self, table: str, column: str, marker: dict):
+        # Loads append export chunks or rewrite files, so only the new and rewritten files are read
+        files = self.change_marker(table)["files"]
+        removed = set(marker["files"]) - set(files)
+        if removed:
+            raise LookupError(f"Exports of '{table}' were removed ({sorted(removed)}), their rows cannot be told apart")
+        changed = [path for path, stat in files.items() if marker["files"].get(path) != stat]
+        if not changed:
+            return None
+        reader = "read_parquet" if changed[0].endswith(".parquet") else "read_csv_auto"
+        earliest = self.read_sql(f"SELECT MIN({column}) AS earliest FROM {reader}({changed!r}, union_by_name = true);")['EARLIEST'][0]
+        return None if pd.isna(earliest) else earliest
+    
+    def pool_options(self) -> dict:
+        return {"max_size": int(os.getenv("LOCAL_POOL_SIZE", 8))}
+    
+    def read_arrow(self, query: str, params: dict = None) -> pa.Table:
+        with self.pool.connection() as connection:
+            table = connection.execute(*self.bind(query, params)).to_arrow_table()
+        # Match Snowflake, which upper-cases unquoted identifiers
+        return table.rename_columns([name.upper() for name in table.column_names])
+    
+    def stream_batches(self, query: str, params: dict = None):
+        with self.pool.connection() as connection:
+            reader = connection.execute(*self.bind(query, params)).fetch_record_batch()
+            for batch in reader:
+                yield batch.rename_columns([name.upper() for name in batch.schema.names])
+    
+    def bind(self, query: str, params: dict = None) -> tuple:
+        # DuckDB names its parameters $name rather than the connector's %(name)s
+        if not params:
+            return (query,)
+        return (re.sub(r"%\((\w+)\)s", r"$\1", query), params)
+    
+    def days_since(self, column: str) -> str:
+        return f"date_diff('day', CAST({column} AS DATE), current_date)"
+    
+    def geometry_wkb(self, column: str) -> str:
+        # Without the spatial extension the GeoJSON text is fetched as is and converted in bulk by geometry_frame
+        return column
+
+
+class BundleConnector(DataConnector):
+    """Serves every dataset from a precomputed bundle (see precompute.py), with no warehouse access"""
+    
+    def __init__(self, bundle_dir: str = None):
+        self.bundle_dir, self.manifest = open_bundle(bundle_dir or os.getenv("BUNDLE_DIR"))
+    
+    def backend_key(self) -> str:
+        # Every bundle version gets its own cached results and indexes, so moving LATEST serves the new bundle at once
+        return f"{type(self).__name__}_{self.manifest['version']}"
+    
+    def close(self):
+        pass
+    
+    def pool_stats(self) -> dict:
+        return {}
+    
+    def read_arrow(self, query: str, params: dict = None) -> pa.Table:
+        raise NotImplementedError("Bundles hold precomputed datasets only, there is no SQL engine to query")
+    
+    def table_versions(self) -> dict:
+        return {table: self.manifest["version"] for table in TABLES}
+    
+    def artifact(self, name: str) -> pd.DataFrame:
+        return read_bundle_file(self.bundle_dir, join("artifacts", f"{name}.parquet"))
+    
+    # Derived from the bundled daily price aggregate, like on the other backends
+    retrieve_price_over_time = DataConnector.retrieve_price_over_time
+    # Binned from the bundled listing points at any size
+    retrieve_hex_grid = DataConnector.retrieve_hex_grid
+    # The index lives on the local disk, built from the bundled listings
+    retrieve_comparables_index = DataConnector.retrieve_comparables_index
+    # Built in memory from the bundled amenities and bitmaps
+    retrieve_amenity_index = DataConnector.retrieve_amenity_index
+    
+    def retrieve_reviews(self, start: str = None, end: str = None, granularity: str = "day") -> pd.DataFrame:
+        # The bundle holds the full daily series, ranges and coarser periods are taken from it in memory
+        daily = read_bundle_file(self.bundle_dir, "retrieve_reviews.parquet")
+        return roll_up(daily, start, end, granularity, ['NUMBER_OF_REVIEW'])
+
+
+def _bundle_reader(name: str):
+    def read(self) -> pd.DataFrame:
+        return read_bundle_file(self.bundle_dir, f"{name}.parquet")
+    read.__name__ = name
+    return read
+
+
+# Every other dataset method of the bundle backend reads its precomputed file
+for _name in DataConnector.datasets():
+    if _name not in vars(BundleConnector):
+        setattr(BundleConnector, _name, _bundle_reader(_name))
+
+
+BACKENDS = {
+    "snowflake": SnowflakeConnector,
+    "local": LocalConnector,
+    "bundle": BundleConnector,
+}
+
+
+def get_connector() -> DataConnector:
+    """Connector for the backend selected by the DATA_BACKEND environment variable (default: snowflake)"""
+    backend = os.getenv("DATA_BACKEND", "snowflake").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown DATA_BACKEND '{backend}', expected one of {list(BACKENDS)}")
+    connector = BACKENDS[backend]()
+    # The first connector of the process warms the caches and keeps them fresh from then on
+    start_scheduler(connector)
+    return connector
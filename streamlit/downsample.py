@@ -0,0 +1,82 @@
+"""
+Shape-preserving downsampling of time series before they are plotted.
+
+`lttb` keeps the points that span the largest triangles between neighbouring buckets
+(Largest-Triangle-Three-Buckets), `min_max` keeps the extremes of every bucket. Both keep
+the first and last point, so the plotted range never shrinks.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Most points a chart is sent, set to 0 to plot every point
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", 400))
+
+
+def _as_float(values: pd.Series) -> np.ndarray:
+    # Dates take part in the triangle areas as nanoseconds
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+    return values.to_numpy(dtype=float)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, target: int) -> np.ndarray:
+    """Indices of the `target` points Largest-Triangle-Three-Buckets keeps, x must be sorted"""
+    n = len(x)
+    if target >= n or target < 3:
+        return np.arange(n)
+
+    # The first and last points are kept, the others are split into target - 2 buckets
+    edges = np.linspace(1, n - 1, target - 1).astype(int)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # The third corner of each triangle is the next bucket's average, the last point for the last bucket
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    indices = np.empty(target, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    # Each bucket depends on the point picked in the previous one, only the buckets are looped over
+    for bucket in range(target - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[selected] - next_x[bucket]) * (y[lo:hi] - y[selected])
+            - (x[selected] - x[lo:hi]) * (next_y[bucket] - y[selected])
+        )
+        selected = lo + int(np.argmax(area))
+        indices[bucket + 1] = selected
+    return indices
+
+
+def min_max(x: np.ndarray, y: np.ndarray, target: int) -> np.ndarray:
+    """Indices of the minimum and maximum of target / 2 equal-count buckets, plus the end points"""
+    n = len(x)
+    if target >= n or target < 4:
+        return np.arange(n)
+
+    buckets = (target - 2) // 2
+    bucket = np.arange(n) * buckets // n
+    # Sorted by bucket then value, each bucket starts at its minimum and ends at its maximum
+    order = np.lexsort((y, bucket))
+    ends = np.searchsorted(bucket[order], np.arange(buckets), side="right")
+    starts = np.concatenate(([0], ends[:-1]))
+    return np.unique(np.concatenate(([0, n - 1], order[starts], order[ends - 1])))
+
+
+METHODS = {
+    "lttb": lttb,
+    "min_max": min_max,
+}
+
+
+def downsample(frame: pd.DataFrame, x: str, y: str, target: int = None, method: str = "lttb") -> pd.DataFrame:
+    """Rows of `frame` to plot `y` against `x` with at most `target` points (default CHART_MAX_POINTS)"""
+    target = CHART_MAX_POINTS if target is None else target
+    frame = frame.dropna(subset=[x, y]).sort_values(x, ignore_index=True)
+    if not target or len(frame) <= target:
+        return frame
+    indices = METHODS[method](_as_float(frame[x]), _as_float(frame[y]), target)
+    return frame.iloc[indices].reset_index(drop=True)
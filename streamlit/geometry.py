@@ -0,0 +1,126 @@
+"""
+Community boundaries as WKB, with their centroids, label points and bounding boxes.
+
+Boundaries are fetched once as WKB (or GeoJSON text where the engine cannot convert them), decoded
+in bulk with shapely's vectorized functions, and kept as WKB next to the points and boxes derived
+from them. Pages then decode the WKB straight into a GeoDataFrame, without parsing GeoJSON or
+building geometries one row at a time.
+
+Listings are assigned to communities from their coordinates with an STR-tree over the boundaries:
+one bulk query prefilters every point by bounding box and tests the few candidate polygons exactly.
+"""
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+CRS = "EPSG:4326"
+
+# Listings this far outside every community (Airbnb blurs locations by up to about 150 m) go to the nearest one
+SNAP_METERS = float(os.getenv("COMMUNITY_SNAP_METERS", 150))
+
+# How a listing's community was found, see assign_communities
+ASSIGNMENT_STATUSES = ['inside', 'boundary', 'snapped', 'unassigned', 'missing']
+
+# Metres per degree of latitude, and of longitude at the equator
+METERS_PER_DEGREE = 111_320
+
+
+def decode(values) -> np.ndarray:
+    """Shapely geometries from WKB bytes or GeoJSON text, whichever the column holds"""
+    values = np.asarray(values, dtype=object)
+    if len(values) and isinstance(values[0], str):
+        return shapely.from_geojson(values)
+    return shapely.from_wkb(values)
+
+
+def geometry_frame(ids, geometries) -> pd.DataFrame:
+    """One row per id with its geometry as WKB, centroid, a label point inside it and its bounding box"""
+    geometries = decode(geometries)
+    centroids = shapely.centroid(geometries)
+    # Unlike the centroid, this point always lies on the geometry, even for concave or multi-part ones
+    labels = shapely.point_on_surface(geometries)
+    bounds = shapely.bounds(geometries)
+    return pd.DataFrame({
+        'COMMUNITY_ID': np.asarray(ids),
+        'GEOMETRY': shapely.to_wkb(geometries),
+        'CENTROID_X': shapely.get_x(centroids),
+        'CENTROID_Y': shapely.get_y(centroids),
+        'LABEL_X': shapely.get_x(labels),
+        'LABEL_Y': shapely.get_y(labels),
+        'MIN_X': bounds[:, 0],
+        'MIN_Y': bounds[:, 1],
+        'MAX_X': bounds[:, 2],
+        'MAX_Y': bounds[:, 3],
+    })
+
+
+def to_geodataframe(frame: pd.DataFrame) -> gpd.GeoDataFrame:
+    """GeoDataFrame of a frame with a WKB GEOMETRY column"""
+    geometry = gpd.GeoSeries.from_wkb(frame['GEOMETRY'], index=frame.index, crs=CRS)
+    return gpd.GeoDataFrame(frame.drop(columns='GEOMETRY'), geometry=geometry)
+
+
+def _to_meters(geometries, latitude: float):
+    # Equirectangular projection around `latitude`: exact enough within a city, and affine so containment is unchanged
+    scale = np.array([METERS_PER_DEGREE * np.cos(np.radians(latitude)), METERS_PER_DEGREE])
+    return shapely.transform(geometries, lambda coordinates: coordinates * scale)
+
+
+def assign_communities(longitudes, latitudes, ids, geometries, snap_meters: float = SNAP_METERS) -> pd.DataFrame:
+    """
+    Community of every point, one row per point in order, with how it was found:
+    'inside' one community, on the 'boundary' of several (the lowest id is kept), 'snapped' to the nearest one
+    within `snap_meters`, 'unassigned' farther out, or 'missing' coordinates. DISTANCE_M is 0 unless snapped.
+    """
+    ids = np.asarray(ids)
+    x = np.asarray(longitudes, dtype=float)
+    y = np.asarray(latitudes, dtype=float)
+    polygons = decode(geometries)
+    shapely.prepare(polygons)
+    tree = shapely.STRtree(polygons)
+
+    missing = np.isnan(x) | np.isnan(y)
+    candidates = np.flatnonzero(~missing)
+    # Bounding-box prefilter for every point at once, then the exact test of each polygon against its candidate points
+    point_index, tree_index = tree.query(shapely.points(x[candidates], y[candidates]))
+    point_index = candidates[point_index]
+    order = np.argsort(tree_index, kind="stable")
+    point_index, tree_index = point_index[order], tree_index[order]
+    inside = np.zeros(len(point_index), dtype=bool)
+    starts = np.flatnonzero(np.diff(tree_index, prepend=-1))
+    for start, end in zip(starts, np.append(starts[1:], len(tree_index))):
+        rows = point_index[start:end]
+        inside[start:end] = shapely.intersects_xy(polygons[tree_index[start]], x[rows], y[rows])
+    point_index, matched_ids = point_index[inside], ids[tree_index[inside]]
+
+    count = len(x)
+    community = np.full(count, np.nan)
+    distance = np.zeros(count)
+    status = np.full(count, 'unassigned', dtype=object)
+    # Lowest id first for every point, so points on a shared border go to the same community every time
+    order = np.lexsort((matched_ids, point_index))
+    point_index, matched_ids = point_index[order], matched_ids[order]
+    points, first, matches = np.unique(point_index, return_index=True, return_counts=True)
+    community[points] = matched_ids[first]
+    status[points] = np.where(matches > 1, 'boundary', 'inside')
+
+    outside = np.setdiff1d(candidates, points)
+    if len(outside) and snap_meters > 0:
+        # Distances in metres, only for the few points outside every community
+        bounds = shapely.total_bounds(polygons)
+        latitude = (bounds[1] + bounds[3]) / 2
+        near_tree = shapely.STRtree(_to_meters(polygons, latitude))
+        (near_index, tree_index), distances = near_tree.query_nearest(
+            _to_meters(shapely.points(x[outside], y[outside]), latitude),
+            max_distance=snap_meters, return_distance=True, all_matches=False,
+        )
+        near = outside[near_index]
+        community[near] = ids[tree_index]
+        distance[near] = distances
+        status[near] = 'snapped'
+
+    status[missing] = 'missing'
+    return pd.DataFrame({'COMMUNITY_ID': community, 'STATUS': status, 'DISTANCE_M': distance})
@@ -0,0 +1,101 @@
+"""
+Hedonic price model: log price regressed on every amenity, the room type and the community.
+
+The listing × feature design matrix is sparse (a listing has a few dozen of several hundred amenities
+and one room type and community), so it is built as a scipy.sparse matrix straight from the amenity
+bitmaps. The ridge fit only needs its small feature × feature Gram matrix, summed over row chunks,
+which also gives the standard errors. Effects are percentage price differences holding the other features fixed.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.linalg import cho_factor, cho_solve
+from scipy.stats import norm
+
+# Ridge penalty on the coefficients, and the fewest listings an amenity needs to get one
+RIDGE_ALPHA = float(os.getenv("HEDONIC_ALPHA", 1.0))
+MIN_LISTINGS = int(os.getenv("HEDONIC_MIN_LISTINGS", 20))
+CONFIDENCE = 0.95
+
+# Listings densified at a time while summing the Gram matrix
+CHUNK_ROWS = 16384
+
+
+def design_matrix(bits: np.ndarray, names: list, listing_count: int, categoricals: dict,
+                  min_listings: int = MIN_LISTINGS) -> tuple:
+    """
+    (matrix, features): a CSR matrix with one 0/1 column per amenity offered by at least `min_listings`
+    listings and per level of every categorical except its most common one, which is the baseline.
+    `bits` holds the packed amenity bitmaps, one row per name; `categoricals` maps a kind to one value per listing.
+    """
+    # Built column by column, every column's listings are already in order
+    columns, features = [], []
+    for code, name in enumerate(names):
+        listings = np.flatnonzero(np.unpackbits(bits[code], count=listing_count))
+        if len(listings) >= min_listings:
+            columns.append(listings)
+            features.append(('amenity', name, len(listings)))
+
+    for kind, values in categoricals.items():
+        values = pd.Series(values).reset_index(drop=True)
+        # Listings with a missing value fall in the baseline
+        for level, count in values.value_counts().iloc[1:].items():
+            columns.append(np.flatnonzero((values == level).to_numpy()))
+            features.append((kind, level, int(count)))
+
+    indptr = np.concatenate(([0], np.cumsum([len(column) for column in columns]))).astype(np.int64)
+    indices = np.concatenate(columns) if columns else np.zeros(0, dtype=np.int64)
+    matrix = sparse.csc_matrix((np.ones(len(indices)), indices, indptr), shape=(listing_count, len(features)))
+    return matrix.tocsr(), pd.DataFrame(features, columns=['KIND', 'FEATURE', 'LISTING_COUNT'])
+
+
+def gram(matrix, chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    """Dense feature × feature matrixᵀ·matrix, summed over row chunks densified one at a time"""
+    total = np.zeros((matrix.shape[1], matrix.shape[1]))
+    for start in range(0, matrix.shape[0], chunk_rows):
+        # 0/1 products sum exactly in float32 well past any listing count
+        chunk = matrix[start:start + chunk_rows].toarray().astype(np.float32)
+        total += chunk.T @ chunk
+    return total
+
+
+def fit_ridge(matrix, target: np.ndarray, alpha: float = RIDGE_ALPHA) -> tuple:
+    """(coefficients, standard errors) of a ridge regression of `target` on `matrix` plus an unpenalized intercept"""
+    # Centering both sides takes the intercept out of the penalized problem
+    rows = matrix.shape[0]
+    column_means = np.asarray(matrix.mean(axis=0)).ravel()
+    centered_target = target - target.mean()
+    centered_gram = gram(matrix) - rows * np.outer(column_means, column_means)
+
+    # Normal equations of the centered design, small and dense whatever the number of listings
+    factor = cho_factor(centered_gram + alpha * np.eye(len(centered_gram)))
+    coefficients = cho_solve(factor, matrix.T @ centered_target)
+
+    # Sandwich covariance of the ridge estimator
+    hat = cho_solve(factor, centered_gram)
+    residuals = centered_target - (matrix @ coefficients - column_means @ coefficients)
+    # Effective degrees of freedom of the ridge fit, plus one for the intercept
+    dof = max(rows - np.trace(hat) - 1, 1)
+    covariance = residuals @ residuals / dof * cho_solve(factor, hat.T)
+    return coefficients, np.sqrt(np.clip(np.diag(covariance), 0, None))
+
+
+def amenity_effects(prices, bits: np.ndarray, names: list, categoricals: dict,
+                    alpha: float = RIDGE_ALPHA, min_listings: int = MIN_LISTINGS) -> pd.DataFrame:
+    """Percentage price effect of every feature with its confidence interval, from listings with a positive price"""
+    prices = np.asarray(prices, dtype=float)
+    matrix, features = design_matrix(bits, names, len(prices), categoricals, min_listings)
+    priced = np.flatnonzero(prices > 0)
+    coefficients, std_errors = fit_ridge(matrix[priced], np.log(prices[priced]), alpha)
+
+    z = norm.ppf(0.5 + CONFIDENCE / 2)
+    features['COEFFICIENT'] = coefficients
+    features['STD_ERROR'] = std_errors
+    # Log-price coefficients as percentage differences against the baseline
+    features['EFFECT'] = np.expm1(coefficients)
+    features['EFFECT_LOW'] = np.expm1(coefficients - z * std_errors)
+    features['EFFECT_HIGH'] = np.expm1(coefficients + z * std_errors)
+    features['FEATURE'] = features['FEATURE'].astype(str)
+    return features
@@ -0,0 +1,80 @@
+"""
+Hexagonal grid aggregation of listings.
+
+Listings are projected to metres around the city's latitude and binned into pointy-top hexagons of a
+given size with axial coordinates and cube rounding, all vectorized, so any resolution is computed
+from scratch over every listing in a fraction of a second. Each cell carries its listing count, mean
+and median price and mean rating, and its hexagon as WKB for the map.
+"""
+import numpy as np
+import pandas as pd
+import shapely
+
+from geometry import METERS_PER_DEGREE
+
+# Hexagon sizes (centre to corner, in metres) offered on the map, coarse to fine
+HEX_SIZES = (1000, 500, 250)
+DEFAULT_HEX_SIZE = 500
+
+SQRT3 = np.sqrt(3)
+
+
+def _scale(latitude: float) -> np.ndarray:
+    # Metres per degree of longitude and latitude around `latitude`
+    return np.array([METERS_PER_DEGREE * np.cos(np.radians(latitude)), METERS_PER_DEGREE])
+
+
+def cells(x: np.ndarray, y: np.ndarray, size: float) -> tuple:
+    """(q, r) axial coordinates of the hexagon holding each point, for coordinates in metres"""
+    q = (SQRT3 / 3 * x - y / 3) / size
+    r = (2 / 3 * y) / size
+    s = -q - r
+    # Round the cube coordinates and fix the one that moved most, so q + r + s stays 0
+    rq, rr, rs = np.rint(q), np.rint(r), np.rint(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def centers(q: np.ndarray, r: np.ndarray, size: float) -> tuple:
+    """(x, y) centres in metres of the hexagons with axial coordinates q, r"""
+    return size * SQRT3 * (q + r / 2), size * 1.5 * r
+
+
+def hexagons(x: np.ndarray, y: np.ndarray, size: float) -> np.ndarray:
+    """Corners of the pointy-top hexagons centred on x, y, shaped (cells, 7, 2) with the ring closed"""
+    angles = np.radians(30 + 60 * np.arange(7))
+    return np.stack([x[:, None] + size * np.cos(angles), y[:, None] + size * np.sin(angles)], axis=-1)
+
+
+def hex_grid(longitudes, latitudes, prices, ratings, size: float = DEFAULT_HEX_SIZE) -> pd.DataFrame:
+    """One row per hexagon holding listings, with its statistics, centre and hexagon (WKB) in degrees"""
+    longitudes = np.asarray(longitudes, dtype=float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    located = ~(np.isnan(longitudes) | np.isnan(latitudes))
+    # Rounded, so the grid stays put when a reload moves the median latitude a little
+    latitude = round(float(np.median(latitudes[located])), 1) if located.any() else 0.0
+    scale = _scale(latitude)
+
+    q, r = cells(longitudes[located] * scale[0], latitudes[located] * scale[1], size)
+    listings = pd.DataFrame({
+        'Q': q,
+        'R': r,
+        'PRICE': np.asarray(prices, dtype=float)[located],
+        'RATING': np.asarray(ratings, dtype=float)[located],
+    })
+    grid = listings.groupby(['Q', 'R']).agg(
+        LISTING_COUNT=('PRICE', 'size'),
+        MEAN_PRICE=('PRICE', 'mean'),
+        MEDIAN_PRICE=('PRICE', 'median'),
+        MEAN_RATING=('RATING', 'mean'),
+    ).reset_index()
+
+    x, y = centers(grid['Q'].to_numpy(), grid['R'].to_numpy(), size)
+    grid['CENTER_X'] = x / scale[0]
+    grid['CENTER_Y'] = y / scale[1]
+    grid['GEOMETRY'] = shapely.to_wkb(shapely.polygons(hexagons(x, y, size) / scale))
+    return grid
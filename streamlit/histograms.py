@@ -0,0 +1,71 @@
+"""
+Histograms and summary statistics of host-level measures, computed in memory from the host rollup.
+
+The rollup (one row per host) is fetched and cached once per listings load, so moving a bin slider
+rebins a few thousand values instead of scanning listings again. Edges are either equal-width between
+the measure's minimum and maximum (or a given range), or its quantiles so every bin holds about as many hosts.
+"""
+import numpy as np
+import pandas as pd
+
+# Host-level measures, named like the retrieve_host_rollup columns they match
+HOST_MEASURES = ("AVG_REVIEWS_PER_MONTH", "LISTING_COUNT")
+
+EDGE_METHODS = ("fixed", "quantile")
+
+
+def _values(hosts: pd.DataFrame, measure: str) -> pd.Series:
+    if measure not in HOST_MEASURES:
+        raise ValueError(f"Unknown host measure '{measure}', expected one of {list(HOST_MEASURES)}")
+    return hosts[measure].astype(float)
+
+
+def unique_edges(edges) -> np.ndarray:
+    # Quantiles of a measure with many equal values repeat, which would leave empty zero-width bins
+    edges = np.unique(np.asarray(edges, dtype=float))
+    # A measure with a single value still gets one (zero-width) bin
+    return edges if len(edges) > 1 else np.repeat(edges, 2)
+
+
+def histogram_frame(counts: pd.DataFrame, edges) -> pd.DataFrame:
+    """Every superhost flag and bin with its edges, including the bins no host falls in"""
+    groups = sorted(counts['HOST_IS_SUPERHOST'].dropna().unique()) or [0, 1]
+    grid = pd.MultiIndex.from_product([groups, range(len(edges) - 1)], names=['HOST_IS_SUPERHOST', 'BIN'])
+    frame = counts.set_index(['HOST_IS_SUPERHOST', 'BIN'])['HOST_COUNT'].reindex(grid, fill_value=0).reset_index()
+    frame['LOW'] = np.asarray(edges)[frame['BIN']]
+    frame['HIGH'] = np.asarray(edges)[frame['BIN'] + 1]
+    return frame
+
+
+def histogram_in_memory(hosts: pd.DataFrame, measure: str, bins: int, method: str, low=None, high=None) -> pd.DataFrame:
+    """Number of hosts per superhost flag and bin of `measure`; bins are [low, high), the last one closed"""
+    values = _values(hosts, measure)
+    if method == "quantile":
+        # np.quantile interpolates linearly like PERCENTILE_CONT
+        edges = np.quantile(values.dropna(), np.linspace(0, 1, bins + 1))
+    elif method != "fixed":
+        raise ValueError(f"Unknown edge method '{method}', expected one of {list(EDGE_METHODS)}")
+    else:
+        edges = np.linspace(values.min() if low is None else low, values.max() if high is None else high, bins + 1)
+    edges = unique_edges(edges)
+    inside = (values >= edges[0]) & (values <= edges[-1])
+    counts = pd.DataFrame({
+        'HOST_IS_SUPERHOST': hosts.loc[inside, 'HOST_IS_SUPERHOST'],
+        'BIN': np.searchsorted(edges[1:-1], values[inside], side="right"),
+    }).groupby(['HOST_IS_SUPERHOST', 'BIN']).size().reset_index(name='HOST_COUNT')
+    return histogram_frame(counts, edges)
+
+
+def summary_in_memory(hosts: pd.DataFrame, measure: str) -> pd.DataFrame:
+    """Count, mean, sample standard deviation, min, quartiles and max of `measure` per superhost flag"""
+    values = _values(hosts, measure).groupby(hosts['HOST_IS_SUPERHOST'])
+    return pd.DataFrame({
+        'HOST_COUNT': values.count(),
+        'MEAN': values.mean(),
+        'STD': values.std(),
+        'MIN': values.min(),
+        'P25': values.quantile(0.25),
+        'MEDIAN': values.median(),
+        'P75': values.quantile(0.75),
+        'MAX': values.max(),
+    }).reset_index()
@@ -0,0 +1,145 @@
+"""
+Folium elements for the community maps.
+
+SwitchableChoropleth ships the boundaries once as TopoJSON levels (see topology.py) together with a
+color per community for every metric. The browser shows the level matching the zoom, and switching
+the metric restyles the layer already on the map instead of rebuilding it.
+"""
+import html
+import json
+
+import branca.colormap
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement, Template
+from folium.elements import JSCSSMixin
+
+from topology import feature_id
+
+MISSING_COLOR = '#d3d3d3'
+
+
+class SwitchableChoropleth(JSCSSMixin, MacroElement):
+    """Choropleth of several metrics over multi-resolution TopoJSON boundaries, with a metric switch and legend"""
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var levels = {{ this.levels|tojson }};
+            var metrics = {{ this.metrics|tojson }};
+            var tooltips = {{ this.tooltips|tojson }};
+            var metric = 0, level = null, layer = null, features = {};
+
+            function style(feature) {
+                return {
+                    fillColor: metrics[metric].colors[feature.id] || '{{ this.missing_color }}',
+                    fillOpacity: {{ this.fill_opacity }},
+                    color: '#444444',
+                    weight: 1,
+                    opacity: {{ this.line_opacity }}
+                };
+            }
+
+            function levelFor(zoom) {
+                for (var i = 0; i < levels.length - 1; i++) {
+                    if (zoom <= levels[i].max_zoom) return i;
+                }
+                return levels.length - 1;
+            }
+
+            function show(index) {
+                if (index === level) return;
+                // A level is decoded from TopoJSON the first time the map is zoomed into its range
+                if (!features[index]) {
+                    var topology = levels[index].topology;
+                    features[index] = topojson.feature(topology, topology.objects.communities);
+                }
+                var next = L.geoJSON(features[index], {
+                    style: style,
+                    onEachFeature: function (feature, shape) { shape.bindTooltip(tooltips[feature.id] || ''); }
+                }).addTo(map);
+                if (layer) map.removeLayer(layer);
+                layer = next;
+                level = index;
+            }
+
+            show(levelFor(map.getZoom()));
+            map.on('zoomend', function () { show(levelFor(map.getZoom())); });
+
+            var control = L.control({position: 'topright'});
+            control.onAdd = function () {
+                var div = L.DomUtil.create('div', 'leaflet-bar');
+                div.style.cssText = 'background: white; padding: 6px; width: 180px; font: 12px Arial, sans-serif;';
+                var select = L.DomUtil.create('select', '', div);
+                select.style.width = '100%';
+                metrics.forEach(function (m, i) {
+                    var option = L.DomUtil.create('option', '', select);
+                    option.value = i;
+                    option.text = m.label;
+                });
+                var legend = L.DomUtil.create('div', '', div);
+                function drawLegend() {
+                    var m = metrics[metric];
+                    legend.innerHTML = '<div style="display: flex; margin-top: 4px;">'
+                        + m.legend.colors.map(function (c) { return '<span style="flex: 1; height: 10px; background: ' + c + ';"></span>'; }).join('')
+                        + '</div><div style="display: flex; justify-content: space-between;"><span>' + m.legend.low
+                        + '</span><span>' + m.legend.high + '</span></div>';
+                }
+                drawLegend();
+                L.DomEvent.disableClickPropagation(div);
+                // Only the fill colors change, the geometry stays loaded
+                L.DomEvent.on(select, 'change', function () {
+                    metric = +select.value;
+                    layer.setStyle(style);
+                    drawLegend();
+                });
+                return div;
+            };
+            control.addTo(map);
+        })();
+        {% endmacro %}
+        """
+    )
+
+    default_js = [
+        ("topojson-client", "https://cdn.jsdelivr.net/npm/topojson-client@3/dist/topojson-client.min.js"),
+    ]
+
+    def __init__(self, levels: pd.DataFrame, data: pd.DataFrame, metrics: dict, key: str = 'COMMUNITY_ID',
+                 name: str = 'NAME', fill_color: str = 'YlOrRd', bins: int = 6,
+                 fill_opacity: float = 0.7, line_opacity: float = 0.2):
+        """
+        `levels` holds the MAX_ZOOM and TOPOLOGY of every level, `data` one row per `key` with its `name` and
+        metric columns, and `metrics` maps each metric column to its (label, format string).
+        """
+        super().__init__()
+        self._name = "SwitchableChoropleth"
+        self.levels = [
+            {'max_zoom': None if pd.isna(row.MAX_ZOOM) else int(row.MAX_ZOOM), 'topology': json.loads(row.TOPOLOGY)}
+            for row in levels.sort_values('LEVEL').itertuples(index=False)
+        ]
+        ids = [str(feature_id(value)) for value in data[key]]
+        self.metrics = [self._metric(ids, data[column], label, fmt, fill_color, bins) for column, (label, fmt) in metrics.items()]
+        self.tooltips = {
+            id_: '<br>'.join([f"<b>{html.escape(str(community))}</b>"] + [
+                f"{label}: {'n/a' if pd.isna(value) else fmt.format(value)}" for (label, fmt), value in zip(metrics.values(), values)
+            ])
+            for id_, community, values in zip(ids, data[name], data[list(metrics)].itertuples(index=False))
+        }
+        self.missing_color = MISSING_COLOR
+        self.fill_opacity = fill_opacity
+        self.line_opacity = line_opacity
+
+    @staticmethod
+    def _metric(ids: list, values: pd.Series, label: str, fmt: str, fill_color: str, bins: int) -> dict:
+        # Equal-width steps between the lowest and highest value, like folium's Choropleth
+        values = values.astype(float)
+        low, high = (values.min(), values.max()) if values.notna().any() else (0.0, 1.0)
+        colormap = getattr(branca.colormap.linear, f"{fill_color}_09").scale(low, high if high > low else low + 1).to_step(bins)
+        return {
+            'label': label,
+            'colors': {id_: colormap.rgb_hex_str(value) for id_, value in zip(ids, values) if not np.isnan(value)},
+            'legend': {'colors': [colormap.rgb_hex_str(value) for value in colormap.index[:-1]], 'low': fmt.format(low), 'high': fmt.format(high)},
+        }
@@ -0,0 +1,128 @@
+"""
+Declarative registry of metrics and dimensions, and a planner that fuses metric requests.
+
+Pages ask for metrics by dimensions with a MetricRequest. All requests against the same table are
+answered by one generated query: every distinct grouping becomes a GROUPING SET of a single scan,
+and the result is split back out per request.
+"""
+from typing import NamedTuple
+
+import pandas as pd
+
+
+class Metric(NamedTuple):
+    table: str
+    sql: str
+
+
+class Dimension(NamedTuple):
+    table: str
+    sql: str
+
+
+class MetricRequest(NamedTuple):
+    metrics: tuple
+    by: tuple = ()
+
+
+def _amenity_price(amenity: str) -> Metric:
+    return Metric("listings", f"AVG(CASE WHEN amenities LIKE '%\"{amenity}\"%' THEN price ELSE NULL END)")
+
+
+METRICS = {
+    "average_price": Metric("listings", "AVG(price)"),
+    "overall_avg_price": Metric("listings", "AVG(price)"),
+    "min_price": Metric("listings", "MIN(price)"),
+    "max_price": Metric("listings", "MAX(price)"),
+    "std_deviation": Metric("listings", "STDDEV(price)"),
+    "number_of_listings": Metric("listings", "COUNT(*)"),
+    "average_reviews": Metric("listings", "AVG(number_of_reviews)"),
+    "average_overall_rating": Metric("listings", "AVG(review_scores_rating)"),
+    "average_cleanliness_rating": Metric("listings", "AVG(review_scores_cleanliness)"),
+    "average_location_rating": Metric("listings", "AVG(review_scores_location)"),
+}
+
+# Average price of the listings offering each amenity, named after it
+AMENITY_METRICS = {
+    "wifi": "Wifi",
+    "air_conditioning": "Air conditioning",
+    "pool": "Pool",
+    "bathtub": "Bathtub",
+    "central_heating": "Central heating",
+    "free_parking": "Free parking on premises",
+    "free_street_parking": "Free street parking",
+}
+METRICS.update({name: _amenity_price(amenity) for name, amenity in AMENITY_METRICS.items()})
+
+DIMENSIONS = {
+    "neighbourhood": Dimension("listings", "host_neighbourhood"),
+    "room_type": Dimension("listings", "room_type"),
+    "community_id": Dimension("listings", "community_id"),
+    "host_is_superhost": Dimension("listings", "host_is_superhost"),
+}
+
+# Requests behind the pages' datasets, answered together by one scan per table
+REGISTERED = {
+    "suhas_query_1": MetricRequest(("average_price", "min_price", "max_price", "std_deviation"), by=("neighbourhood", "room_type")),
+    "suhas_query_2": MetricRequest(("average_price", "average_reviews"), by=("neighbourhood",)),
+    "suhas_query_3": MetricRequest(("average_price", "number_of_listings"), by=("room_type",)),
+    "suhas_query_5": MetricRequest(("average_price", "average_overall_rating", "average_cleanliness_rating", "average_location_rating"), by=("neighbourhood",)),
+    # Everything the Price & Reviews charts filter and brush on, in one neighbourhood-level frame
+    "neighbourhood_summary": MetricRequest(("average_price", "number_of_listings", "average_reviews", "average_overall_rating", "average_cleanliness_rating", "average_location_rating"), by=("neighbourhood",)),
+}
+
+
+def _unique(items) -> list:
+    return list(dict.fromkeys(items))
+
+
+def table_of(request: MetricRequest) -> str:
+    tables = {METRICS[name].table for name in request.metrics} | {DIMENSIONS[name].table for name in request.by}
+    if len(tables) != 1:
+        raise ValueError(f"A metric request must stay within one table, got {sorted(tables)}")
+    return tables.pop()
+
+
+class FusedQuery:
+    """One query answering every request against `table`"""
+
+    def __init__(self, table: str, requests):
+        self.table = table
+        self.requests = [request for request in requests if table_of(request) == table]
+        self.dimensions = _unique(name for request in self.requests for name in request.by)
+        self.metrics = _unique(name for request in self.requests for name in request.metrics)
+        self.grouping_sets = _unique(tuple(request.by) for request in self.requests)
+
+    @property
+    def sql(self) -> str:
+        columns = [f"{DIMENSIONS[name].sql} AS {name}" for name in self.dimensions]
+        columns += [f"{METRICS[name].sql} AS {name}" for name in self.metrics]
+        dimension_sql = [DIMENSIONS[name].sql for name in self.dimensions]
+
+        group_by = ""
+        if len(self.grouping_sets) > 1:
+            # GROUPING() tells the sets apart, including a NULL key from a rolled-up one
+            columns.append(f"GROUPING({', '.join(dimension_sql)}) AS grouping_id")
+            sets = ", ".join("(" + ", ".join(DIMENSIONS[name].sql for name in grouping) + ")" for grouping in self.grouping_sets)
+            group_by = f"GROUP BY GROUPING SETS ({sets})"
+        elif self.dimensions:
+            group_by = f"GROUP BY {', '.join(dimension_sql)}"
+
+        newline = ",\n                "
+        return f"""
+            SELECT
+                {newline.join(columns)}
+            FROM
+                {self.table}
+            {group_by};
+        """
+
+    def split(self, frame: pd.DataFrame, request: MetricRequest) -> pd.DataFrame:
+        """Rows and columns of the fused result that answer `request`"""
+        if "GROUPING_ID" in frame.columns:
+            # GROUPING(a, b, ...) sets the bit of every dimension rolled up, the first one most significant
+            n = len(self.dimensions)
+            grouping_id = sum(1 << (n - 1 - i) for i, name in enumerate(self.dimensions) if name not in request.by)
+            frame = frame[frame["GROUPING_ID"] == grouping_id]
+        columns = [name.upper() for name in request.by] + [name.upper() for name in request.metrics]
+        return frame[columns].reset_index(drop=True)
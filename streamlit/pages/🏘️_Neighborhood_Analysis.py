@@ -3,19 +3,18 @@
 * Bottom 15 Chicago neighborhoods by average Airbnb rental cost (Suhas's code)
 * Are listing prices positively or negatively correlated with changes in the amount of crime reports in Chicago as a whole? (Poon's code)
 """
-import json
 from streamlit_folium import folium_static
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
-import streamlit as st
-import streamlit as st
-import geopandas as gpd
-from shapely.geometry import shape, Polygon
 import folium
 
 # Custom imports
-from data import SnowflakeConnector
+from data import get_connector
+from geometry import to_geodataframe
+from hexgrid import DEFAULT_HEX_SIZE, HEX_SIZES
+from maps import SwitchableChoropleth
+import branca.colormap
 from util import handle_env
 
 # Set up page configuration
@@ -23,7 +22,9 @@ st.set_page_config(page_title="🏘️ Neighborhood Analysis.py", page_icon="
 
 # Set up environment and database connection
 handle_env()
-snowflake_cxn = SnowflakeConnector()
+snowflake_cxn = get_connector()
+# Submit every query the page needs up front so they run concurrently while the sections render
+datasets = snowflake_cxn.prefetch("suhas_query_1", "retrieve_community_data", "retrieve_community_topology")
 
 # Markdown for the page
 st.markdown(
@@ -48,7 +49,7 @@ st.markdown(
     ### Top 15 Neighborhoods
     """
 )
-q1_df = snowflake_cxn.suhas_query_1()
+q1_df = datasets["suhas_query_1"].result()
 q1_df = q1_df.sort_values(by='AVERAGE_PRICE', ascending=False)
 
 plt.figure(figsize=(15, 10))  # Adjust the size of the plot as needed
@@ -129,62 +130,104 @@ st.markdown(
     """
 )
 
-df = snowflake_cxn.retrieve_community_data()
-
-# Convert stringified GeoJSON to dictionary
-df['GEOMETRY'] = df['GEOMETRY'].apply(lambda x: json.loads(x))
-
-# Function to calculate centroids and create folium map
-def create_folium_map(df):
-    x_list = []
-    y_list = []
-    
-    # Calculate centroids
-    for index, row in df.iterrows():
-        polygon = Polygon(row['GEOMETRY']['coordinates'][0][0])
-        centroid_point = polygon.centroid
-        x_list.append(centroid_point.x)
-        y_list.append(centroid_point.y)
-    
-    df['X'] = x_list
-    df['Y'] = y_list
-    
-    # Now you can apply 'shape' to each GeoJSON object
-    gdf = gpd.GeoDataFrame(df, geometry=[shape(geojson) for geojson in df['GEOMETRY']])
-    gdf.set_crs(epsg=4326, inplace=True)  # Set the coordinate reference system to WGS84
+df = datasets["retrieve_community_data"].result()
+# Boundaries simplified for each zoom range as TopoJSON, cached until the communities are reloaded
+topology_df = datasets["retrieve_community_topology"].result()
+
+# Metrics the map can be colored by, with how to show their values
+map_metrics = {
+    'CRIME_RATE': ('Crime Rate', '{:,.2f}'),
+    'AVG_PRICE': ('Average Price ($)', '${:,.1f}'),
+    'REVIEW_COUNT': ('Number of Reviews', '{:,.0f}'),
+    'AVG_RATING': ('Average Rating', '{:.2f}'),
+}
+
+# Metrics the optional hexagon layer can be colored by
+hex_metrics = {
+    'LISTING_COUNT': 'Number of Listings',
+    'MEAN_PRICE': 'Average Price ($)',
+    'MEDIAN_PRICE': 'Median Price ($)',
+    'MEAN_RATING': 'Average Rating',
+}
+
+# Streamlit widgets for the hexagon layer, which shows the variation inside communities
+show_hexagons = st.checkbox("Show listings on a hexagon grid")
+if show_hexagons:
+    size_column, metric_column = st.columns(2)
+    hex_size = size_column.select_slider("Hexagon size (m)", options=HEX_SIZES, value=DEFAULT_HEX_SIZE)
+    hex_metric = metric_column.selectbox("Color hexagons by", options=list(hex_metrics), format_func=hex_metrics.get)
+
+# Add listings binned into hexagons as a layer that can also be toggled in the map's layer control
+def add_hexagon_layer(chicago_map, size, metric):
+    # Binned once per size and cached
+    grid = snowflake_cxn.retrieve_hex_grid(size).round({'MEAN_PRICE': 1, 'MEDIAN_PRICE': 1, 'MEAN_RATING': 2})
+    gdf = to_geodataframe(grid.drop(columns=['Q', 'R']))
+    values = gdf[metric].dropna()
+    # Without a single value (e.g. no hexagon has a rated listing) the scale falls back to 0-1 and the legend is left out
+    low, high = (values.min(), max(values.max(), values.min() + 1)) if len(values) else (0, 1)
+    colormap = branca.colormap.linear.YlGnBu_09.scale(low, high).to_step(6)
+    colormap.caption = f"{hex_metrics[metric]} per {size} m hexagon"
     
+    layer = folium.FeatureGroup(name=colormap.caption)
+    folium.GeoJson(
+        gdf,
+        style_function=lambda feature: {
+            'fillColor': '#d3d3d3' if feature['properties'][metric] is None else colormap(feature['properties'][metric]),
+            'fillOpacity': 0.6,
+            'color': '#ffffff',
+            'weight': 0.5,
+        },
+        tooltip=folium.GeoJsonTooltip(fields=list(hex_metrics), aliases=list(hex_metrics.values())),
+    ).add_to(layer)
+    layer.add_to(chicago_map)
+    if len(values):
+        colormap.add_to(chicago_map)
+    folium.LayerControl(position='bottomright').add_to(chicago_map)
+
+# Function to create folium map
+def create_folium_map(df):
     # Create a folium map centered on Chicago
     chicago_map = folium.Map(location=[41.8781, -87.6298], zoom_start=10)
     
-    # Add the geospatial data to the map
-    folium.Choropleth(
-        geo_data=gdf,
-        data=gdf,
-        columns=['COMMUNITY_ID', 'CRIME_RATE'],
-        key_on='feature.properties.COMMUNITY_ID',
-        fill_color='YlOrRd',
-        fill_opacity=0.7,
-        line_opacity=0.2,
-        legend_name='Crime Rate',
-    ).add_to(chicago_map)
+    # Add the boundaries once; switching the metric in the map's control recolors them in the browser,
+    # and hovering over a community shows all of its metrics
+    SwitchableChoropleth(topology_df, df, map_metrics).add_to(chicago_map)
     
-    # Add markers for average room prices
-    for index, row in df.iterrows():
-        folium.Marker(
-            location=[row['Y'], row['X']],
-            popup=row['NAME'],
-            icon=folium.DivIcon(html=f"<div style='font-size: 8pt; color: black;'>${row['AVG_PRICE']}</div>")
-        ).add_to(chicago_map)
+    if show_hexagons:
+        add_hexagon_layer(chicago_map, hex_size, hex_metric)
     
     return chicago_map
 
-# Assuming df is your DataFrame with the necessary data
-# You would call your database or CSV load function here to get the df ready
-
 # Display the map in Streamlit
 st_folium_map = create_folium_map(df)
 folium_static(st_folium_map)
 
+# Listings are placed in communities by their coordinates; show how that went
+with st.expander("Community assignment of listings"):
+    st.markdown(
+        """
+        Each listing is assigned to the community its coordinates fall in. Listings on a border between communities
+        go to the one with the lowest id, and listings just outside every community (locations are blurred by up to
+        about 150 m) are snapped to the nearest one. *Changed* counts listings whose community differs from the one
+        stored on the listings table.
+        """
+    )
+    st.dataframe(
+        snowflake_cxn.community_assignment_report(),
+        hide_index=True,
+        column_config={
+            'STATUS': 'Status',
+            'LISTING_COUNT': 'Listings',
+            'CHANGED': 'Changed',
+            'MAX_DISTANCE_M': st.column_config.NumberColumn('Farthest (m)', format="%.0f"),
+        },
+    )
+    assignments = snowflake_cxn.retrieve_listing_communities()
+    unassigned = assignments[assignments['STATUS'].isin(['unassigned', 'missing'])]
+    if len(unassigned):
+        st.markdown(f"{len(unassigned):,} listings are not in any community:")
+        st.dataframe(unassigned[['LISTING_ID', 'STATUS', 'IMPUTED_COMMUNITY_ID']], hide_index=True)
+
 # st.markdown(
 #     """
 #     ### Insights
@@ -5,18 +5,17 @@ Relationship between the average price of a listing and the cleanliness rating (
 Relationship between the average price of a listing and the average location rating (Suhas's code)
 """
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import seaborn as sns
-import matplotlib.pyplot as plt
+import altair as alt
 
 # Custom imports
-from data import SnowflakeConnector
+from data import get_connector
 from util import handle_env
 
 # Set up environment and database connection
 handle_env()
-snowflake_cxn = SnowflakeConnector()
+snowflake_cxn = get_connector()
+# Submit every query the page needs up front so they run concurrently while the sections render
+datasets = snowflake_cxn.prefetch("retrieve_neighbourhood_summary")
 
 # Set up page configuration
 st.set_page_config(page_title="🏷️ Price & Reviews", page_icon="🏷️")
@@ -49,41 +48,56 @@ def set_chart_title(fig, title):
     )
     return fig
 
+# The charts carry this small neighbourhood-level frame once; range filters and brushing then run in the browser
+summary_df = datasets["retrieve_neighbourhood_summary"].result()
+# Display names double as axis titles and tooltips
+display_names = {
+    'NEIGHBOURHOOD': 'Neighborhood',
+    'AVERAGE_PRICE': 'Average Price',
+    'NUMBER_OF_LISTINGS': 'Number of Listings',
+    'AVERAGE_REVIEWS': 'Average Reviews',
+    'AVERAGE_OVERALL_RATING': 'Average Overall Rating',
+    'AVERAGE_CLEANLINESS_RATING': 'Average Cleanliness Rating',
+    'AVERAGE_LOCATION_RATING': 'Average Location Rating',
+}
+summary_df = summary_df.dropna(subset=['AVERAGE_PRICE']).rename(columns=display_names)
+summary_df = summary_df.astype({column: float for column in list(display_names.values())[1:]})
+
+# Create a min/max pair of browser-side sliders and the filter they apply
+# Parameters are named explicitly, Streamlit renames generated names in the spec but not inside filter expressions
+def range_filter(column, step):
+    low, high = float(summary_df[column].min()), float(summary_df[column].max())
+    name = column.lower().replace(' ', '_')
+    low_param = alt.param(name=f"{name}_from", value=low, bind=alt.binding_range(min=low, max=high, step=step, name=f"{column} from "))
+    high_param = alt.param(name=f"{name}_to", value=high, bind=alt.binding_range(min=low, max=high, step=step, name=f"{column} to "))
+    return [low_param, high_param], (alt.datum[column] >= low_param) & (alt.datum[column] <= high_param)
+
+# Scatter of average price against `y`, highlighting the brushed neighborhoods
+def price_scatter(y, brush):
+    return alt.Chart(summary_df).mark_circle(size=60).encode(
+        x=alt.X('Average Price:Q', title='Average Price ($)', scale=alt.Scale(zero=False)),
+        y=alt.Y(y, type='quantitative', scale=alt.Scale(zero=False)),
+        color=alt.condition(brush, alt.value('steelblue'), alt.value('lightgray')),
+        tooltip=['Neighborhood', 'Average Price', alt.Tooltip(y, type='quantitative'), 'Number of Listings'],
+    ).add_params(brush)
+
 # ------------------------ ANALYIS 1 - AVERAGE PRICE VS AVERAGE REVIEWS ------------------------ #
 
 st.markdown("## 1️⃣ Average Price vs. Average Reviews")
 st.markdown(
     """
     In the following graph we investigate the relationship between average price vs average reviews grouped by neighborhood.
+    Use the sliders below the chart to filter by average price, and drag over the chart to highlight neighborhoods.
     """
 )
 
-q2_df = snowflake_cxn.suhas_query_2()
-
-# Set the aesthetic style of the plots
-sns.set_theme(style="ticks")
-
-# Streamlit widget for interactivity
-# For example, a slider to filter data based on a specific column
-price_filter = st.slider("Select a range of Average Price", 
-                         min_value=int(q2_df['AVERAGE_PRICE'].min()), 
-                         max_value=int(q2_df['AVERAGE_PRICE'].max()), 
-                         value=(int(q2_df['AVERAGE_PRICE'].min()), int(q2_df['AVERAGE_PRICE'].max())))
-
-# Filter the dataframe based on the selected price range
-filtered_data = q2_df[(q2_df['AVERAGE_PRICE'] >= price_filter[0]) & (q2_df['AVERAGE_PRICE'] <= price_filter[1])]
-
-# Create a scatter plot
-plt.figure(figsize=(10, 6))
-sns.scatterplot(x='AVERAGE_PRICE', y='AVERAGE_REVIEWS', data=filtered_data)
-
-# Add titles and labels
-plt.title('Average Price vs. Average # of Reviews')
-plt.xlabel('Average Price ($)')
-plt.ylabel('Average Reviews')
-
-# Use Streamlit to display the plot
-st.pyplot(plt)
+# Sliders bound to chart parameters filter in the browser, without a rerun
+price_params, price_filter = range_filter('Average Price', 1)
+reviews_chart = price_scatter('Average Reviews', alt.selection_interval(name='reviews_brush'))
+reviews_chart = reviews_chart.add_params(*price_params).transform_filter(price_filter).properties(
+    title='Average Price vs. Average # of Reviews', width=600, height=360
+)
+st.altair_chart(reviews_chart)
 
 # st.markdown("### Insights")
 # st.markdown(
@@ -112,105 +126,24 @@ st.markdown(
     * Cleanliness Rating
     * Location Rating
     
-    First we will investigate the relationship between average price and the overall rating.
+    The three charts are linked: drag over a price range on any of them to highlight the same neighborhoods on the others,
+    and use the sliders below to filter by each rating.
     """
 )
 
-q5_df = snowflake_cxn.suhas_query_5()
-
-# Streamlit sidebar widgets for interactivity
-rating_filter = st.slider("Filter by average overall rating", 
-                          min_value=float(q5_df['AVERAGE_OVERALL_RATING'].min()), 
-                          max_value=float(q5_df['AVERAGE_OVERALL_RATING'].max()), 
-                          value=(float(q5_df['AVERAGE_OVERALL_RATING'].min()), 
-                                 float(q5_df['AVERAGE_OVERALL_RATING'].max())))
-
-# Filter the dataframe based on the selected average overall rating range
-filtered_data = q5_df[(q5_df['AVERAGE_OVERALL_RATING'] >= rating_filter[0]) & 
-                      (q5_df['AVERAGE_OVERALL_RATING'] <= rating_filter[1])]
-
-# Set the aesthetic style of the plots
-sns.set_theme(style="ticks")
-
-# Create a scatter plot
-plt.figure(figsize=(10, 6))
-sns.scatterplot(x='AVERAGE_PRICE', y='AVERAGE_OVERALL_RATING', data=filtered_data)
-
-# Add titles and labels
-plt.title('Average Price vs. Average Overall Rating')
-plt.xlabel('Average Price ($)')
-plt.ylabel('Average Overall Rating')
-
-# Use Streamlit to display the plot
-st.pyplot(plt)
-
-st.markdown("Second, we will investigate the relationship between average price and the cleanliness rating.")
-
-# Add a slider in the sidebar to filter the plot based on cleanliness rating
-cleanliness_rating_filter = st.slider(
-    'Filter by Average Cleanliness Rating', 
-    min_value=float(q5_df['AVERAGE_CLEANLINESS_RATING'].min()), 
-    max_value=float(q5_df['AVERAGE_CLEANLINESS_RATING'].max()), 
-    value=(float(q5_df['AVERAGE_CLEANLINESS_RATING'].min()), 
-           float(q5_df['AVERAGE_CLEANLINESS_RATING'].max()))
-)
-
-# Filter the dataframe based on the selected average cleanliness rating range
-filtered_data = q5_df[(q5_df['AVERAGE_CLEANLINESS_RATING'] >= cleanliness_rating_filter[0]) & 
-                      (q5_df['AVERAGE_CLEANLINESS_RATING'] <= cleanliness_rating_filter[1])]
-
-# Set the aesthetic style of the plots
-sns.set_theme(style="ticks")
-
-# Create a scatter plot with the filtered data
-plt.figure(figsize=(10, 6))
-sns.scatterplot(
-    x='AVERAGE_PRICE', 
-    y='AVERAGE_CLEANLINESS_RATING', 
-    data=filtered_data
-)
-
-# Add titles and labels
-plt.title('Average Price vs. Average Cleanliness Rating')
-plt.xlabel('Average Price ($)')
-plt.ylabel('Average Cleanliness Rating')
-
-# Use Streamlit to display the plot
-st.pyplot(plt)
-
-st.markdown("Third, we will investigate the relationship between average price and the location rating.")
-
-# Slider for selecting the location rating range
-location_rating_range = st.slider(
-    'Select the range of Location Rating',
-    min_value=float(q5_df['AVERAGE_LOCATION_RATING'].min()),
-    max_value=float(q5_df['AVERAGE_LOCATION_RATING'].max()),
-    value=(float(q5_df['AVERAGE_LOCATION_RATING'].min()), float(q5_df['AVERAGE_LOCATION_RATING'].max()))
-)
-
-# Filtering the dataframe based on the selected location rating range
-filtered_data = q5_df[(q5_df['AVERAGE_LOCATION_RATING'] >= location_rating_range[0]) & 
-                      (q5_df['AVERAGE_LOCATION_RATING'] <= location_rating_range[1])]
-
-# Set the aesthetic style of the plots
-sns.set_theme(style="ticks")
-
-# Create a scatter plot with the filtered data
-fig, ax = plt.subplots(figsize=(10, 6))
-sns.scatterplot(
-    x='AVERAGE_PRICE', 
-    y='AVERAGE_LOCATION_RATING', 
-    data=filtered_data, 
-    ax=ax
-)
-
-# Add titles and labels
-ax.set_title('Average Price vs. Average Location Rating')
-ax.set_xlabel('Average Price ($)')
-ax.set_ylabel('Average Location Rating')
-
-# Display the plot in Streamlit
-st.pyplot(fig)
+# One chart repeated per rating, so a single brush on price is shared by the three, and one range filter per rating
+ratings = ['Average Overall Rating', 'Average Cleanliness Rating', 'Average Location Rating']
+rating_params, rating_filters = [], []
+for rating in ratings:
+    params, expression = range_filter(rating, 0.01)
+    rating_params += params
+    rating_filters.append(expression)
+rating_filter = rating_filters[0] & rating_filters[1] & rating_filters[2]
+
+ratings_chart = price_scatter(alt.repeat('row'), alt.selection_interval(name='ratings_brush', encodings=['x']))
+ratings_chart = ratings_chart.add_params(*rating_params).transform_filter(rating_filter).properties(width=600, height=300)
+ratings_chart = ratings_chart.repeat(row=ratings).properties(title='Average Price vs. Average Ratings')
+st.altair_chart(ratings_chart)
 
 # st.markdown("### Insights")
 # st.markdown(
@@ -13,7 +13,8 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 # Custom imports
-from data import SnowflakeConnector
+from binning import bin_totals, equal_width_edges
+from data import get_connector
 from util import handle_env
 
 # Set up page configuration
@@ -46,7 +47,11 @@ st.markdown(
 
 # Set up environment and database connection
 handle_env()
-snowflake_cxn = SnowflakeConnector()
+snowflake_cxn = get_connector()
+# Submit every query the page needs up front so they run concurrently while the sections render
+datasets = snowflake_cxn.prefetch(
+    "srishti_query_2", "srishti_query_3", ("artifact", {"name": "host_experience_prefix_sums"}),
+)
 
 
 # ------------------------ ANALYIS 1 - VISUALIZE DISTRIBUTION OF HOSTS BY NUMBER OF LISTINGS ------------------------ #
@@ -75,7 +80,7 @@ def set_chart_title(fig, title):
 
 
 # Get data
-q2_df = snowflake_cxn.srishti_query_2()
+q2_df = datasets["srishti_query_2"].result()
 
 # Define custom bins for the number of listings
 bins = [0, 1, 5, 10, 20, 50, 100, 650]
@@ -129,7 +134,7 @@ st.markdown(
     """
 )
 
-q3_df = snowflake_cxn.srishti_query_3()
+q3_df = datasets["srishti_query_3"].result()
 st.table(q3_df)
 
 # Create a new column to represent the combination of profile pic and superhost status
@@ -184,34 +189,37 @@ st.plotly_chart(fig, use_container_width=True)
 
 st.markdown("Given these insights, let's now visualize how superhost status affects the number of monthly reviews a host receives.")
 
-q6_df = snowflake_cxn.srishti_query_6()
+# Binning options; the bins are counted in the engine, so only the counts reach the page
+edge_method = st.radio("Bin edges", ["Fixed width", "Quantiles"], horizontal=True)
+number_of_histogram_bins = st.slider("Number of histogram bins", min_value=5, max_value=60, value=32, step=1)
+if edge_method == "Fixed width":
+    # Same view as before: 0 to 8 reviews per month
+    histogram_df = snowflake_cxn.host_histogram(bins=number_of_histogram_bins, low=0, high=8)
+else:
+    histogram_df = snowflake_cxn.host_histogram(bins=number_of_histogram_bins, method="quantile")
 
 # Create histograms for superhosts and non-superhosts
 fig = go.Figure()
 
-# Histogram for superhosts
-fig.add_trace(go.Histogram(
-    x=q6_df[q6_df['HOST_IS_SUPERHOST'] == 1]['AVG_REVIEWS_PER_MONTH'],
-    name='Superhosts',
-    marker_color='skyblue',
-    opacity=0.75
-))
-
-# Histogram for non-superhosts
-fig.add_trace(go.Histogram(
-    x=q6_df[q6_df['HOST_IS_SUPERHOST'] == 0]['AVG_REVIEWS_PER_MONTH'],
-    name='Non-Superhosts',
-    marker_color='salmon',
-    opacity=0.75
-))
+for superhost, name, color in [(1, 'Superhosts', 'skyblue'), (0, 'Non-Superhosts', 'salmon')]:
+    group_df = histogram_df[histogram_df['HOST_IS_SUPERHOST'] == superhost]
+    fig.add_trace(go.Bar(
+        x=(group_df['LOW'] + group_df['HIGH']) / 2,
+        y=group_df['HOST_COUNT'],
+        width=(group_df['HIGH'] - group_df['LOW']) * 0.8,
+        customdata=group_df[['LOW', 'HIGH']],
+        hovertemplate='%{customdata[0]:.2f} to %{customdata[1]:.2f}: %{y} hosts',
+        name=name,
+        marker_color=color,
+        opacity=0.75
+    ))
 
 # Set plot labels and title
 fig.update_layout(
     title='Distribution of Average Reviews per Month (Superhosts vs Non-Superhosts)',
     xaxis_title='Average Reviews per Month',
     yaxis_title='Frequency',
-    bargap=0.2,
-    xaxis=dict(range=[0, 8]),
+    barmode='overlay',
     legend=dict(
         x=0.8,
         y=1,
@@ -223,6 +231,11 @@ fig.update_layout(
 # Display the figure in Streamlit
 st.plotly_chart(fig, use_container_width=True)
 
+# Summary statistics of both groups over all hosts
+summary_df = snowflake_cxn.host_summary()
+summary_df['HOST_IS_SUPERHOST'] = summary_df['HOST_IS_SUPERHOST'].map({1: 'Superhosts', 0: 'Non-Superhosts'})
+st.table(summary_df.set_index('HOST_IS_SUPERHOST').astype(float).round(2))
+
 # st.markdown(
 #     """
 #     ### Insights
@@ -246,17 +259,28 @@ st.markdown(
     """
 )
 
-q6_df = snowflake_cxn.suhas_query_6()
-
-# Interactive slider for the number of bins
-number_of_bins = st.slider('Select number of bins', min_value=3, max_value=10, value=6, step=1)
-
-# Dynamically create bins based on the slider
-max_days = max(q6_df['DAYS_AS_HOST'])
-bins = pd.cut(q6_df['DAYS_AS_HOST'], bins=np.linspace(0, max_days, num=number_of_bins))
-
-# Group by the created bins
-df_binned = q6_df.groupby(bins)['AVERAGE_PRICE'].mean().reset_index()
+# Running listing counts and price sums by days as host, so any binning is a few lookups
+prefix_df = datasets["artifact"].result()
+max_days = prefix_df['DAYS_AS_HOST'].max()
+
+# Interactive slider for the number of bins, or custom bin edges
+number_of_bins = st.slider('Select number of bins', min_value=1, max_value=50, value=5, step=1)
+custom_edges = st.text_input('Or enter custom bin edges in days (comma separated, e.g. 0, 365, 1825, 3650)')
+
+# Dynamically create bins based on the inputs
+edges = equal_width_edges(0, max_days, number_of_bins)
+if custom_edges:
+    try:
+        edges = sorted(float(edge) for edge in custom_edges.split(',') if edge.strip())
+    except ValueError:
+        st.warning("Bin edges must be numbers, using the slider instead.")
+    if len(edges) < 2:
+        st.warning("Enter at least two bin edges, using the slider instead.")
+        edges = equal_width_edges(0, max_days, number_of_bins)
+
+# Average price of each bin, weighted by the number of listings behind each day
+df_binned = bin_totals(prefix_df, 'DAYS_AS_HOST', edges)
+df_binned['AVERAGE_PRICE'] = df_binned['PRICE_SUM'] / df_binned['LISTING_COUNT'].where(df_binned['LISTING_COUNT'] > 0)
 
 # Set the aesthetic style of the plots
 sns.set_theme(style="ticks")
@@ -3,8 +3,9 @@ import pandas as pd
 import plotly.express as px
 
 # Custom imports
-from data import SnowflakeConnector
-from util import handle_env
+from data import get_connector
+from downsample import downsample
+from util import fragment, handle_env
 
 # Set up page configuration
 st.set_page_config(page_title="📈 Chicago Airbnb Market Dynamics Analysis", page_icon="💵")
@@ -36,27 +37,18 @@ st.markdown(
 
 # Set up environment and database connection
 handle_env()
-snowflake_cxn = SnowflakeConnector()
-df = snowflake_cxn.retrieve_price_over_time()
-
-# Convert 'DATE' to datetime and create 'day' column
-df['DATE'] = pd.to_datetime(df['DATE'])
-df['day'] = df['DATE'].dt.day_name()
-
-# Sidebar for date range selection
-start_date, end_date = st.sidebar.date_input(
-    "Select Date Range for Listing Timeseries",
-    [df['DATE'].min(), df['DATE'].max()],
-    min_value=df['DATE'].min(),
-    max_value=df['DATE'].max()
-)
+snowflake_cxn = get_connector()
+# The date pickers only need the first and last date of each series, not the series themselves
+bounds = snowflake_cxn.retrieve_date_bounds().set_index('SERIES')
 
-# Convert start_date and end_date to pandas datetime
-start_date = pd.to_datetime(start_date)
-end_date = pd.to_datetime(end_date)
+PERIOD_NAMES = {'day': 'Daily', 'week': 'Weekly', 'month': 'Monthly', 'quarter': 'Quarterly'}
 
-# Filter data based on the selected date range
-filtered_df = df[(df['DATE'] >= start_date) & (df['DATE'] <= end_date)]
+# Both series are precomputed for the whole city and for each community
+communities = snowflake_cxn.retrieve_community_data()[['COMMUNITY_ID', 'NAME']].sort_values('NAME')
+community_names = dict(zip(communities['NAME'], communities['COMMUNITY_ID']))
+community = st.sidebar.selectbox("Select Community", ["All of Chicago"] + list(community_names))
+community_id = community_names.get(community)
+st.sidebar.success("☝️ Select a community for listings and reviews, each section has its own date range.")
 
 
 # ------------------------ ANALYIS 1 - AVERAGE LISTING PRICES OVER TIME ------------------------ #
@@ -84,33 +76,8 @@ def set_chart_title(fig, title):
     return fig
 
 
-# Plotting the time series chart using Plotly
-time_series_fig = px.line(
-    filtered_df,
-    x='DATE',
-    y='AVG_PRICE',
-    markers=True
-)
-time_series_fig = set_chart_title(time_series_fig, "Time Series of Average Listing Prices")
-st.plotly_chart(time_series_fig)
-
-st.markdown("Additionally we can study the average listing prices distributed by day of the week to understand weekly demand fluctuations and possibly recommend strategic pricing for hosts.")
-
-# Group by 'day' and calculate the average price for the filtered data
-avg_price_by_weekday = filtered_df.groupby('day')['AVG_PRICE'].mean().reset_index()
-
 # Set the order of weekdays
 weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-avg_price_by_weekday['day'] = pd.Categorical(avg_price_by_weekday['day'], categories=weekday_order, ordered=True)
-avg_price_by_weekday = avg_price_by_weekday.sort_values('day')
-
-# st.markdown(
-#     """
-#     ## Average Listing Price by Weekday
-#     The chart below illustrates how the average listing prices vary across different days of the week.
-#     This can reveal patterns related to weekly booking trends and preferences.
-#     """
-# )
 
 weekday_colors = {
     'Monday': 'blue',
@@ -122,20 +89,74 @@ weekday_colors = {
     'Sunday': 'purple'
 }
 
-# Create a list of colors for the bars in the order of the DataFrame
-bar_colors = [weekday_colors[day] for day in avg_price_by_weekday['day']]
-
-# Plotting the weekday chart using Plotly with specific colors for each day
-weekday_fig = px.bar(
-    avg_price_by_weekday,
-    x='day',
-    y='AVG_PRICE',
-    labels={'day': 'Day of the Week', 'AVG_PRICE': 'Average Price'},
-    color='day',
-    color_discrete_map=weekday_colors  # Apply the color mapping
-)
-weekday_fig = set_chart_title(weekday_fig, "Average Listing Price by Weekday")
-st.plotly_chart(weekday_fig)
+
+@fragment
+def price_over_time_section():
+    # Date range for this section only, changing it reruns just this section
+    start_date, end_date = st.date_input(
+        "Select Date Range for Listing Timeseries",
+        [bounds.loc['price', 'MIN_DATE'], bounds.loc['price', 'MAX_DATE']],
+        min_value=bounds.loc['price', 'MIN_DATE'],
+        max_value=bounds.loc['price', 'MAX_DATE']
+    )
+
+    # The charts use the coarsest rollup that still shows enough points for the range, the weekday averages the daily one
+    series_df, price_granularity = snowflake_cxn.series("price", start_date, end_date, community_id)
+    filtered_df, _ = snowflake_cxn.series("price", start_date, end_date, community_id, granularity="day")
+
+    # Convert 'DATE' to datetime and create 'day' column
+    series_df['DATE'] = pd.to_datetime(series_df['DATE'])
+    filtered_df['DATE'] = pd.to_datetime(filtered_df['DATE'])
+    filtered_df['day'] = filtered_df['DATE'].dt.day_name()
+
+    # Plotting the time series chart using Plotly, thinned to the points that keep its shape
+    plotted_df = downsample(series_df, 'DATE', 'AVG_PRICE')
+    time_series_fig = px.line(
+        plotted_df,
+        x='DATE',
+        y='AVG_PRICE',
+        markers=True
+    )
+    time_series_fig = set_chart_title(time_series_fig, "Time Series of Average Listing Prices")
+    st.plotly_chart(time_series_fig)
+    st.caption(f"{PERIOD_NAMES[price_granularity]} average listing price in {community}.")
+    if len(plotted_df) < len(series_df):
+        st.caption(f"📉 Downsampled to {len(plotted_df)} of {len(series_df)} points.")
+
+    st.markdown("Additionally we can study the average listing prices distributed by day of the week to understand weekly demand fluctuations and possibly recommend strategic pricing for hosts.")
+
+    # Group by 'day' and calculate the average price for the filtered data
+    avg_price_by_weekday = filtered_df.groupby('day')['AVG_PRICE'].mean().reset_index()
+
+    # Set the order of weekdays
+    avg_price_by_weekday['day'] = pd.Categorical(avg_price_by_weekday['day'], categories=weekday_order, ordered=True)
+    avg_price_by_weekday = avg_price_by_weekday.sort_values('day')
+
+    # st.markdown(
+    #     """
+    #     ## Average Listing Price by Weekday
+    #     The chart below illustrates how the average listing prices vary across different days of the week.
+    #     This can reveal patterns related to weekly booking trends and preferences.
+    #     """
+    # )
+
+    # Create a list of colors for the bars in the order of the DataFrame
+    bar_colors = [weekday_colors[day] for day in avg_price_by_weekday['day']]
+
+    # Plotting the weekday chart using Plotly with specific colors for each day
+    weekday_fig = px.bar(
+        avg_price_by_weekday,
+        x='day',
+        y='AVG_PRICE',
+        labels={'day': 'Day of the Week', 'AVG_PRICE': 'Average Price'},
+        color='day',
+        color_discrete_map=weekday_colors  # Apply the color mapping
+    )
+    weekday_fig = set_chart_title(weekday_fig, "Average Listing Price by Weekday")
+    st.plotly_chart(weekday_fig)
+
+
+price_over_time_section()
 
 # st.markdown("### Insights")
 # st.markdown(
@@ -160,57 +181,61 @@ st.markdown(
     """
 )
 
-# Pul data from Snowflake
-reviews_df = snowflake_cxn.retrieve_reviews()
-reviews_df['DATE'] = pd.to_datetime(reviews_df['DATE'])
 
-# Sidebar for date range selection
-review_start_date, review_end_date = st.sidebar.date_input(
-    "Select Date Range for Reviews Timeseries",
-    [reviews_df['DATE'].min(), reviews_df['DATE'].max()],
-    min_value=reviews_df['DATE'].min(),
-    max_value=reviews_df['DATE'].max()
-)
-st.sidebar.success("☝️ Select a date range for listings and reviews.")
+@fragment
+def review_frequency_section():
+    # Date range for this section only, changing it reruns just this section
+    review_start_date, review_end_date = st.date_input(
+        "Select Date Range for Reviews Timeseries",
+        [bounds.loc['reviews', 'MIN_DATE'], bounds.loc['reviews', 'MAX_DATE']],
+        min_value=bounds.loc['reviews', 'MIN_DATE'],
+        max_value=bounds.loc['reviews', 'MAX_DATE']
+    )
 
-# Convert start_date and end_date to pandas datetime
-review_start_date = pd.to_datetime(review_start_date)
-review_end_date = pd.to_datetime(review_end_date)
+    # Pul data from the precomputed review rollups, limited to the selected date range
+    reviews_series_df, review_granularity = snowflake_cxn.series("reviews", review_start_date, review_end_date, community_id)
+    filtered_reviews_df, _ = snowflake_cxn.series("reviews", review_start_date, review_end_date, community_id, granularity="day")
+    reviews_series_df['DATE'] = pd.to_datetime(reviews_series_df['DATE'])
+    filtered_reviews_df['DATE'] = pd.to_datetime(filtered_reviews_df['DATE'])
+
+    # Plotting the time series chart using Plotly, thinned to the points that keep its shape
+    plotted_reviews_df = downsample(reviews_series_df, 'DATE', 'NUMBER_OF_REVIEW')
+    review_time_series_fig = px.line(
+        plotted_reviews_df,
+        x='DATE',
+        y='NUMBER_OF_REVIEW',
+        markers=True
+    )
+    review_time_series_fig = set_chart_title(review_time_series_fig, "Time Series of Review Frequency")
+    st.plotly_chart(review_time_series_fig)
+    st.caption(f"Number of reviews per {review_granularity} in {community}.")
+    if len(plotted_reviews_df) < len(reviews_series_df):
+        st.caption(f"📉 Downsampled to {len(plotted_reviews_df)} of {len(reviews_series_df)} points.")
+
+    # Creating 'day' column in the review DataFrame
+    filtered_reviews_df['day'] = filtered_reviews_df['DATE'].dt.day_name()
+
+    # Group by 'day' and calculate the average number of reviews
+    avg_reviews_by_weekday = filtered_reviews_df.groupby('day')['NUMBER_OF_REVIEW'].mean().reset_index()
+
+    # Set the order of weekdays for the review data
+    avg_reviews_by_weekday['day'] = pd.Categorical(avg_reviews_by_weekday['day'], categories=weekday_order, ordered=True)
+    avg_reviews_by_weekday = avg_reviews_by_weekday.sort_values('day')
+
+    # Plotting the weekly review frequency chart using Plotly
+    review_weekday_fig = px.bar(
+        avg_reviews_by_weekday,
+        x='day',
+        y='NUMBER_OF_REVIEW',
+        labels={'day': 'Day of the Week', 'NUMBER_OF_REVIEW': 'Average Number of Reviews'},
+        color='day',
+        color_discrete_map=weekday_colors  # Reuse the color mapping
+    )
+    review_weekday_fig = set_chart_title(review_weekday_fig, "Average Review Frequency by Weekday")
+    st.plotly_chart(review_weekday_fig)
 
-# Filter data based on the selected date range
-filtered_reviews_df = reviews_df[(reviews_df['DATE'] >= review_start_date) & (reviews_df['DATE'] <= review_end_date)]
 
-# Plotting the time series chart using Plotly
-review_time_series_fig = px.line(
-    filtered_reviews_df,
-    x='DATE',
-    y='NUMBER_OF_REVIEW',
-    markers=True
-)
-review_time_series_fig = set_chart_title(review_time_series_fig, "Time Series of Review Frequency")
-st.plotly_chart(review_time_series_fig)
-
-# Creating 'day' column in the review DataFrame
-filtered_reviews_df['day'] = filtered_reviews_df['DATE'].dt.day_name()
-
-# Group by 'day' and calculate the average number of reviews
-avg_reviews_by_weekday = filtered_reviews_df.groupby('day')['NUMBER_OF_REVIEW'].mean().reset_index()
-
-# Set the order of weekdays for the review data
-avg_reviews_by_weekday['day'] = pd.Categorical(avg_reviews_by_weekday['day'], categories=weekday_order, ordered=True)
-avg_reviews_by_weekday = avg_reviews_by_weekday.sort_values('day')
-
-# Plotting the weekly review frequency chart using Plotly
-review_weekday_fig = px.bar(
-    avg_reviews_by_weekday,
-    x='day',
-    y='NUMBER_OF_REVIEW',
-    labels={'day': 'Day of the Week', 'NUMBER_OF_REVIEW': 'Average Number of Reviews'},
-    color='day',
-    color_discrete_map=weekday_colors  # Reuse the color mapping
-)
-review_weekday_fig = set_chart_title(review_weekday_fig, "Average Review Frequency by Weekday")
-st.plotly_chart(review_weekday_fig)
+review_frequency_section()
 
 # st.markdown("### Insights")
 # st.markdown(
@@ -1,11 +1,12 @@
 import streamlit as st
+import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-import streamlit as st
 
 # Custom imports
-from data import SnowflakeConnector
-from util import handle_env
+from amenities import DEFAULT_AMENITIES
+from data import get_connector
+from util import fragment, handle_env
 
 # Set up page configuration
 st.set_page_config(page_title="🛏️ Listing Characteristics", page_icon="🛏️")
@@ -19,14 +20,20 @@ st.markdown(
     
     1. How does Airbnb type (room type) affect the average price of a listing?
     2. Availability of which amenity has the highest impact on price and what is the average price of an Airbnb with that amenity?
+    3. Which amenities still affect price once room type and community are accounted for?
+    4. What do similar listings nearby charge?
     """
 )
 
 # Set up environment and database connection
 handle_env()
-snowflake_cxn = SnowflakeConnector()
+snowflake_cxn = get_connector()
+# Submit every query the page needs up front so they run concurrently while the sections render
+datasets = snowflake_cxn.prefetch(
+    "suhas_query_3", "retrieve_amenity_index", "retrieve_amenity_effects", "retrieve_comparables_index"
+)
 
-q3_df = snowflake_cxn.suhas_query_3()
+q3_df = datasets["suhas_query_3"].result()
 
 # ------------------------ ANALYIS 1 - Effect of Airbnb Type on Average Listing Price ------------------------ #
 
@@ -53,8 +60,10 @@ plt.xlabel('Room Type')
 # Rotate X-axis labels
 plt.xticks(rotation=45)
 
-# Display the average price above each bar
+# Display the average price above each bar, amenities no priced listing offers have no bar to label
 for p in ax.patches:
+    if pd.isna(p.get_height()):
+        continue
     ax.annotate(f'${p.get_height():.2f}', 
                 (p.get_x() + p.get_width() / 2., p.get_height()), 
                 ha='center', va='center', 
@@ -86,20 +95,25 @@ st.markdown(
     """
 )
 
-q4_df = snowflake_cxn.suhas_query_4()
-q4_df = q4_df.T.reset_index()
-q4_df.columns = ['AMENITIES', 'AVERAGE_PRICE']
+# Wait for the amenity index of the current listings, then look every amenity up in its bitmaps
+datasets["retrieve_amenity_index"].result()
+amenity_index = snowflake_cxn.amenity_index()
+amenity_summary = amenity_index.summary()
 
-# Streamlit sidebar widgets for interactivity, if needed
-# For example, a multiselect widget to choose specific amenities to display
+# Streamlit widgets for interactivity, every amenity in the data can be selected
 selected_amenities = st.multiselect(
     'Select Amenities to Display',
-    options=q4_df['AMENITIES'].unique(),
-    default=q4_df['AMENITIES'].unique()
+    options=amenity_index.names,
+    default=[amenity for amenity in DEFAULT_AMENITIES if amenity in amenity_index.names]
 )
 
-# Filter the dataframe based on the selected amenities
-filtered_data = q4_df[q4_df['AMENITIES'].isin(selected_amenities)]
+# Average price of the listings with each selected amenity, next to all listings
+filtered_data = amenity_summary[amenity_summary['AMENITY'].isin(selected_amenities)].rename(columns={'AMENITY': 'AMENITIES'})
+all_listings = amenity_index.select([])
+filtered_data = pd.concat([
+    filtered_data,
+    pd.DataFrame({'AMENITIES': ['All Listings'], 'AVERAGE_PRICE': [all_listings['AVERAGE_PRICE']]}),
+], ignore_index=True)
 
 # Set the aesthetic style of the plots
 sns.set_theme(style="ticks")
@@ -118,8 +132,10 @@ ax.set_xlabel('Amenities')
 # Rotate X-axis labels
 plt.xticks(rotation=45)
 
-# Display the average price above each bar
+# Display the average price above each bar, amenities no priced listing offers have no bar to label
 for p in ax.patches:
+    if pd.isna(p.get_height()):
+        continue
     ax.annotate(f'${p.get_height():.2f}', 
                 (p.get_x() + p.get_width() / 2., p.get_height()),
                 ha='center', va='center', 
@@ -132,6 +148,32 @@ plt.tight_layout()
 # Display the plot in Streamlit
 st.pyplot(fig)
 
+st.markdown("Listings offering **all** of the selected amenities, compared with the listings that do not:")
+
+# Combined selection, a bitwise AND of the selected amenities' bitmaps
+selection = amenity_index.select(selected_amenities)
+count_column, price_column, lift_column = st.columns(3)
+count_column.metric("Listings", f"{selection['LISTING_COUNT']:,}")
+# No average when no priced listing offers the whole selection
+price_column.metric("Average Price", "n/a" if pd.isna(selection['AVERAGE_PRICE']) else f"${selection['AVERAGE_PRICE']:.2f}")
+# No lift without listings on both sides of the selection
+lift_column.metric("Price Lift", "n/a" if pd.isna(selection['PRICE_LIFT']) else f"{selection['PRICE_LIFT']:+.1%}")
+if selection['LISTING_COUNT'] == 0:
+    st.info("No listing offers all of the selected amenities, remove one to compare prices.")
+
+# Every amenity on its own
+st.dataframe(
+    amenity_summary.sort_values('PRICE_LIFT', ascending=False),
+    hide_index=True,
+    column_config={
+        'AMENITY': 'Amenity',
+        'LISTING_COUNT': 'Listings',
+        'AVERAGE_PRICE': st.column_config.NumberColumn('Average Price', format="$%.2f"),
+        'AVERAGE_PRICE_WITHOUT': st.column_config.NumberColumn('Average Price Without', format="$%.2f"),
+        'PRICE_LIFT': st.column_config.NumberColumn('Price Lift', format="percent"),
+    },
+)
+
 # st.markdown("### Insights")
 # st.markdown(
 #     """
@@ -142,4 +184,128 @@ st.pyplot(fig)
 #         - **For hosts:** ?
 #         - **For guests:** ?
 #     """
-# )
\ No newline at end of file
+# )
+
+# ------------------------ ANALYIS 3 - Amenity effects controlling for room type and community ------------------------ #
+
+st.markdown(
+    """
+    ## 3️⃣ Amenity Effects on Price, Controlling for Room Type and Community
+    
+    Raw averages mix up amenities with the kind of listing and where it is: pools are more common in large entire homes,
+    for example. The following analysis fits one regularized regression of log price on every amenity, the room type and
+    the community together, so each amenity's effect is the price difference between otherwise similar listings.
+    """
+)
+
+effects_df = datasets["retrieve_amenity_effects"].result()
+amenity_effects_df = effects_df[effects_df['KIND'] == 'amenity']
+
+# Streamlit widgets for interactivity
+most = max(len(amenity_effects_df), 1)
+shown = st.slider('Amenities to Display', min_value=1, max_value=most, value=min(20, most))
+order = st.radio('Show', ['Largest price increase', 'Largest price decrease'], horizontal=True)
+
+# Largest effects first, top to bottom
+shown_df = amenity_effects_df.sort_values('EFFECT', ascending=order == 'Largest price decrease').head(shown).iloc[::-1]
+
+# Create a figure for matplotlib
+fig, ax = plt.subplots(figsize=(15, max(4, 0.4 * len(shown_df))))
+
+# Effect of each amenity with its 95% confidence interval
+ax.errorbar(
+    shown_df['EFFECT'] * 100,
+    shown_df['FEATURE'],
+    xerr=[(shown_df['EFFECT'] - shown_df['EFFECT_LOW']) * 100, (shown_df['EFFECT_HIGH'] - shown_df['EFFECT']) * 100],
+    fmt='o', capsize=4,
+)
+ax.axvline(0, color='gray', linestyle='--')
+
+# Add titles and labels
+ax.set_title('Price Effect of Amenities (95% Confidence Interval)')
+ax.set_xlabel('Price Difference (%)')
+ax.set_ylabel('Amenities')
+
+# Adjust the layout
+plt.tight_layout()
+
+# Display the plot in Streamlit
+st.pyplot(fig)
+
+st.caption("Room types and communities are compared with the most common one. Intervals that cross zero are not distinguishable from no effect.")
+
+# Every feature of the model
+st.dataframe(
+    effects_df[['KIND', 'FEATURE', 'LISTING_COUNT', 'EFFECT', 'EFFECT_LOW', 'EFFECT_HIGH']].sort_values('EFFECT', ascending=False),
+    hide_index=True,
+    column_config={
+        'KIND': 'Kind',
+        'FEATURE': 'Feature',
+        'LISTING_COUNT': 'Listings',
+        'EFFECT': st.column_config.NumberColumn('Price Effect', format="percent"),
+        'EFFECT_LOW': st.column_config.NumberColumn('Lower Bound', format="percent"),
+        'EFFECT_HIGH': st.column_config.NumberColumn('Upper Bound', format="percent"),
+    },
+)
+
+# ------------------------ ANALYIS 4 - Comparable listings ------------------------ #
+
+st.markdown(
+    """
+    ## 4️⃣ Comparable Listings
+    
+    What do similar listings nearby charge? Describe a listing, or pick an existing one, to find the listings closest to it
+    in location, room type, bedrooms, guests and rating, and what they cost.
+    """
+)
+
+# Built once per load of the listings and kept on disk, so this only loads it
+datasets["retrieve_comparables_index"].result()
+comparables = snowflake_cxn.comparables_index()
+
+
+@fragment
+def comparables_section():
+    # Inputs for this section only, changing them reruns just this section
+    source = st.radio('Find comparables for', ['A listing I describe', 'An existing listing'], horizontal=True)
+    count = st.slider('Number of Comparable Listings', min_value=5, max_value=50, value=10)
+
+    if source == 'An existing listing':
+        listing_ids = comparables.listings['LISTING_ID']
+        listing_id = st.selectbox('Listing ID', options=listing_ids)
+        comps_df = comparables.comparables_of(listing_id, count)
+    else:
+        location_column, room_column = st.columns(2)
+        latitude = location_column.number_input('Latitude', value=41.8781, format="%.4f")
+        longitude = location_column.number_input('Longitude', value=-87.6298, format="%.4f")
+        room_type = room_column.selectbox('Room Type', options=comparables.room_types)
+        rating = room_column.slider('Rating', min_value=0.0, max_value=5.0, value=4.8, step=0.1)
+        bedrooms_column, guests_column = st.columns(2)
+        bedrooms = bedrooms_column.number_input('Bedrooms', min_value=0, value=1)
+        accommodates = guests_column.number_input('Guests', min_value=1, value=2)
+        comps_df = comparables.query(latitude, longitude, room_type, bedrooms, accommodates, rating, count)
+
+    # What the comparable listings charge
+    prices = comps_df['PRICE'].astype(float)
+    median_column, average_column, range_column = st.columns(3)
+    median_column.metric("Median Price", f"${prices.median():.2f}")
+    average_column.metric("Average Price", f"${prices.mean():.2f}")
+    range_column.metric("Middle Half", f"${prices.quantile(0.25):.0f} – ${prices.quantile(0.75):.0f}")
+
+    st.map(comps_df, latitude='LATITUDE', longitude='LONGITUDE', size=40)
+    st.dataframe(
+        comps_df.drop(columns=['LATITUDE', 'LONGITUDE', 'SIMILARITY']),
+        hide_index=True,
+        column_config={
+            'LISTING_ID': st.column_config.NumberColumn('Listing ID', format="%d"),
+            'ROOM_TYPE': 'Room Type',
+            'BEDROOMS': 'Bedrooms',
+            'ACCOMMODATES': 'Guests',
+            'REVIEW_SCORES_RATING': 'Rating',
+            'PRICE': st.column_config.NumberColumn('Price', format="$%.2f"),
+            'DISTANCE_KM': st.column_config.NumberColumn('Distance (km)', format="%.2f"),
+        },
+    )
+
+
+comparables_section()
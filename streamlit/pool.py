@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool's wait timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections shared across the whole process"""
+
+    def __init__(self, factory, max_size: int = 4, idle_timeout: float = 300, wait_timeout: float = 30, validate=None,
+                 discard_on: tuple = ()):
+        self.factory = factory  # Callable that opens a new connection
+        self.validate = validate  # Callable(connection) -> bool, run on every borrow
+        self.discard_on = discard_on  # Exception types that leave a connection unusable, it is closed instead of reused
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+
+        self._idle = deque()  # (connection, returned_at) pairs, oldest on the left
+        self._size = 0  # Open connections, idle + checked out
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "closed": 0,
+            "evicted_idle": 0,
+            "failed_health_checks": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "peak_in_use": 0,
+        }
+
+    # ---------------------------- CHECKOUT / CHECKIN ---------------------------- #
+
+    def checkout(self):
+        """Borrows a connection, blocking up to `wait_timeout` seconds when the pool is exhausted"""
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            expired = self._pop_expired()
+            while True:
+                if self._idle:
+                    # LIFO so the warmest connections are reused and the cold ones age out
+                    connection, _ = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    connection = None
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No connection available after {self.wait_timeout}s (max_size={self.max_size})")
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._in_use)
+
+        # Network work (closing, validating, connecting) happens outside the lock
+        self._close_all(expired)
+        if connection is not None:
+            if self._healthy(connection):
+                with self._cond:
+                    self._stats["reused"] += 1
+                return connection
+            with self._cond:
+                self._stats["failed_health_checks"] += 1
+            self._close_all([connection])
+
+        try:
+            connection = self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return connection
+
+    def checkin(self, connection, discard: bool = False):
+        """Returns a borrowed connection, closing it instead if `discard` is set"""
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            self._close_all([connection])
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and always gives it back, or closes it after a connection-level error"""
+        connection = self.checkout()
+        discard = False
+        try:
+            yield connection
+        except self.discard_on:
+            # A broken session is not always closed, so the health check on the next borrow would not catch it
+            discard = True
+            raise
+        finally:
+            self.checkin(connection, discard=discard)
+
+    # ---------------------------- MAINTENANCE ---------------------------- #
+
+    def evict_idle(self):
+        """Closes connections that have sat idle for longer than `idle_timeout`"""
+        with self._cond:
+            expired = self._pop_expired()
+        self._close_all(expired)
+
+    def close(self):
+        """Closes every idle connection; checked out connections are closed when discarded"""
+        with self._cond:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        self._close_all(idle)
+
+    def stats(self) -> dict:
+        """Snapshot of the pool counters, used to size `max_size`"""
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                **self._stats,
+            }
+
+    def _pop_expired(self) -> list:
+        # Must be called with the lock held
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+        self._size -= len(expired)
+        self._stats["evicted_idle"] += len(expired)
+        return expired
+
+    def _healthy(self, connection) -> bool:
+        if self.validate is None:
+            return True
+        try:
+            return bool(self.validate(connection))
+        except Exception:
+            return False
+
+    def _close_all(self, connections):
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+            with self._cond:
+                self._stats["closed"] += 1
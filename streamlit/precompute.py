@@ -0,0 +1,132 @@
+"""
+Builds a versioned bundle of every page dataset so deployments can run without warehouse access.
+
+    python streamlit/precompute.py --out bundles
+
+Each run writes `bundles/<version>/` holding one Parquet file per retrieval method, the derived
+artifacts under `artifacts/`, and a `manifest.json` with the SHA-256 checksum of every file, then
+points `bundles/LATEST` at the new version. Serve it with DATA_BACKEND=bundle and BUNDLE_DIR=bundles.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+from os.path import exists, isdir, join
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+MANIFEST = "manifest.json"
+LATEST = "LATEST"
+
+# Bundles whose checksums were already verified by this process
+_VERIFIED = set()
+_VERIFIED_LOCK = threading.Lock()
+
+
+def sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_bundle(connector, out_dir: str) -> str:
+    """
+    Runs every retrieval method and artifact against `connector` and writes a new bundle version.
+    The process's result cache has to start out empty (see main), since nested cached reads are served from it.
+    """
+    # Imported here, the artifacts import the result cache, which main() points at its temporary directory first
+    from artifacts import ARTIFACTS
+
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    bundle_dir = join(out_dir, version)
+    os.makedirs(join(bundle_dir, "artifacts"))
+
+    # Computed against an empty result cache, so every dataset and every cached read inside it is fresh
+    datasets = {}
+    for name in connector.datasets():
+        method = getattr(type(connector), name)
+        datasets[name] = getattr(method, "refresh", method)(connector)
+    frames = {f"{name}.parquet": frame for name, frame in datasets.items()}
+    for name, artifact in ARTIFACTS.items():
+        frames[join("artifacts", f"{name}.parquet")] = getattr(artifact, "refresh", artifact)(connector)
+
+    files = {}
+    for path, frame in frames.items():
+        frame.to_parquet(join(bundle_dir, path), compression="zstd", index=False)
+        files[path] = {"sha256": sha256(join(bundle_dir, path)), "rows": len(frame)}
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": type(connector).__name__,
+        "table_versions": connector.table_versions(),
+        "files": files,
+    }
+    with open(join(bundle_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Switch readers over only once the bundle is complete
+    with open(join(out_dir, LATEST + ".tmp"), "w") as f:
+        f.write(version)
+    os.replace(join(out_dir, LATEST + ".tmp"), join(out_dir, LATEST))
+    return bundle_dir
+
+
+def open_bundle(path: str):
+    """
+    Resolves `path` (a bundle version, or a directory with a LATEST pointer) and returns
+    (bundle_dir, manifest), verifying every checksum the first time a bundle is opened.
+    """
+    if not exists(join(path, MANIFEST)) and exists(join(path, LATEST)):
+        with open(join(path, LATEST)) as f:
+            path = join(path, f.read().strip())
+    if not isdir(path) or not exists(join(path, MANIFEST)):
+        raise FileNotFoundError(f"No bundle found at {path}, build one with `python streamlit/precompute.py`")
+
+    with open(join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    with _VERIFIED_LOCK:
+        if path not in _VERIFIED:
+            for name, entry in manifest["files"].items():
+                if sha256(join(path, name)) != entry["sha256"]:
+                    raise ValueError(f"Checksum mismatch for {name} in bundle {manifest['version']}")
+            _VERIFIED.add(path)
+    return path, manifest
+
+
+def read_bundle_file(bundle_dir: str, name: str) -> pd.DataFrame:
+    # Memory-mapped, so a cold page load is a local read with no copy of the raw file
+    return pq.read_table(join(bundle_dir, name), memory_map=True).to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bundles", help="Directory that holds the bundle versions")
+    args = parser.parse_args()
+
+    # A result cache shared with a running app would serve nested reads from its last load, and the daily
+    # aggregate could miss rewritten calendar dates, so the build gets an empty cache directory of its own
+    cache_dir = tempfile.mkdtemp(prefix="precompute-")
+    os.environ["CACHE_DIR"] = cache_dir
+    # A one-off build has no use for the background cache refresh
+    os.environ.setdefault("REFRESH_INTERVAL", "0")
+    try:
+        from data import get_connector
+        from util import handle_env
+
+        handle_env()
+        bundle_dir = build_bundle(get_connector(), args.out)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print(f"Wrote {bundle_dir}")
+
+
+if __name__ == "__main__":
+    main()
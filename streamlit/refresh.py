@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import wait
+from os.path import join
+
+from cache import RESULT_CACHE, revalidating
+
+logger = logging.getLogger(__name__)
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+class RefreshScheduler:
+    """
+    Background thread that keeps the dataset cache warm.
+
+    On start it refreshes the datasets of tables that changed while the server was down and
+    pre-warms every other dataset. It then polls the table metadata every `interval` seconds and
+    refreshes only the datasets computed from tables whose data changed. Pages keep being served
+    the last good result while a refresh runs.
+    """
+
+    def __init__(self, connector, interval: float = 300):
+        self.connector = connector
+        self.interval = interval
+        self.state_path = join(RESULT_CACHE.directory, f"table_versions_{connector.backend_key()}.json")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        try:
+            self.check_tables()
+            self.warm_up()
+        except Exception:
+            logger.exception("Dataset warm-up failed")
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_tables()
+            except Exception:
+                logger.exception("Table change check failed")
+
+    def warm_up(self):
+        """Loads every dataset concurrently; cached ones are served from the cache, stale ones refresh in the background"""
+        futures = self.connector.prefetch(*self.connector.datasets())
+        wait(futures.values())
+
+    def check_tables(self) -> list:
+        """Refreshes the datasets of every table whose version changed since the last check"""
+        versions = self.connector.table_versions()
+        previous = self._load_state()
+        changed = [table for table, version in versions.items() if previous.get(table) != version]
+        if changed:
+            logger.info("Tables changed: %s", ", ".join(changed))
+            for table in changed:
+                RESULT_CACHE.mark_stale(table)
+            self.refresh(changed)
+        self._save_state(versions)
+        return changed
+
+    def refresh(self, tables):
+        """Recomputes the datasets that depend on any of `tables`, replacing their cached results"""
+        connector_type = type(self.connector)
+        # The changed tables' results are marked stale, so every stale result, nested reads included, is
+        # recomputed once and in dependency order, whatever order the datasets are listed in
+        with revalidating():
+            for name in connector_type.datasets():
+                method = getattr(connector_type, name)
+                if set(getattr(method, "tables", ())) & set(tables):
+                    getattr(self.connector, name)()
+
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def _save_state(self, versions: dict):
+        with open(self.state_path, "w") as f:
+            json.dump(versions, f)
+
+
+def start_scheduler(connector) -> RefreshScheduler:
+    """Starts the process-wide scheduler once; REFRESH_INTERVAL=0 disables it"""
+    global _SCHEDULER
+    interval = float(os.getenv("REFRESH_INTERVAL", 300))
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None and interval > 0:
+            _SCHEDULER = RefreshScheduler(connector, interval)
+            _SCHEDULER.start()
+        return _SCHEDULER
@@ -0,0 +1,127 @@
+"""
+Community boundaries as TopoJSON, simplified for several map zoom ranges.
+
+Each level is a coverage simplification of the boundaries (shapely.coverage_simplify), so a border
+shared by two communities is simplified once and the same way on both sides, with no gaps or
+overlaps. Each level is then encoded as a TopoJSON topology: coordinates are quantized to a grid,
+borders are cut at the junctions where three or more communities meet into arcs, and every arc is
+stored once, delta-encoded, and referenced by both communities it separates.
+"""
+import json
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import shapely
+
+# Simplified levels for zoom levels up to each of these, and full resolution above the last one
+ZOOM_LEVELS = (10, 12)
+# Grid steps across the bounding box the coordinates are quantized to
+QUANTIZATION = 100_000
+
+
+def pixel_degrees(zoom: int) -> float:
+    """Width of a web map pixel in degrees of longitude at `zoom`"""
+    return 360 / (256 * 2 ** zoom)
+
+
+def feature_id(value):
+    """JSON id of a community: an integer for whole numbers, which may arrive as floats or decimals"""
+    try:
+        return int(value) if float(value).is_integer() else value
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def topology_levels(ids, geometries, zoom_levels=ZOOM_LEVELS, quantization: int = QUANTIZATION) -> pd.DataFrame:
+    """One row per level with the highest zoom it is shown at (NaN for full resolution) and its TopoJSON text"""
+    geometries = np.asarray(geometries, dtype=object)
+    if len(geometries) and isinstance(geometries[0], bytes):
+        geometries = shapely.from_wkb(geometries)
+    levels = [(zoom, pixel_degrees(zoom)) for zoom in zoom_levels] + [(np.nan, 0.0)]
+    rows = []
+    for level, (zoom, tolerance) in enumerate(levels):
+        simplified = shapely.coverage_simplify(geometries, tolerance) if tolerance else geometries
+        rows.append({
+            'LEVEL': level,
+            'MAX_ZOOM': zoom,
+            'TOLERANCE': tolerance,
+            'TOPOLOGY': json.dumps(encode(ids, simplified, quantization), separators=(',', ':')),
+        })
+    return pd.DataFrame(rows)
+
+
+def encode(ids, geometries, quantization: int = QUANTIZATION) -> dict:
+    """TopoJSON topology with one `communities` object holding a (multi)polygon per id"""
+    x0, y0, x1, y1 = shapely.total_bounds(geometries)
+    scale = ((x1 - x0) / (quantization - 1) or 1.0, (y1 - y0) / (quantization - 1) or 1.0)
+
+    # Every polygon as rings of grid points, without the repeats quantization leaves behind
+    polygons = []
+    for geometry in geometries:
+        parts = []
+        for polygon in getattr(geometry, 'geoms', [geometry]):
+            rings = [_quantize(ring, (x0, y0), scale) for ring in [polygon.exterior, *polygon.interiors]]
+            if len(rings[0]) >= 3:
+                parts.append([ring for ring in rings if len(ring) >= 3])
+        polygons.append(parts)
+
+    junctions = _junctions([ring for parts in polygons for rings in parts for ring in rings])
+    arcs, index = [], {}
+    objects = []
+    for id_, parts in zip(ids, polygons):
+        encoded = [[_ring_arcs(ring, junctions, arcs, index) for ring in rings] for rings in parts]
+        geometry = {'type': 'Polygon', 'arcs': encoded[0]} if len(encoded) == 1 else {'type': 'MultiPolygon', 'arcs': encoded}
+        objects.append({**geometry, 'id': feature_id(id_)})
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': list(scale), 'translate': [x0, y0]},
+        'objects': {'communities': {'type': 'GeometryCollection', 'geometries': objects}},
+        # First point absolute, then differences to the previous one
+        'arcs': [np.concatenate(([arc[0]], np.diff(arc, axis=0))).tolist() for arc in arcs],
+    }
+
+
+def _quantize(ring, translate, scale) -> np.ndarray:
+    """Open ring (no closing point) of integer grid points"""
+    points = np.rint((shapely.get_coordinates(ring) - translate) / scale).astype(np.int64)[:-1]
+    keep = np.any(points != np.roll(points, 1, axis=0), axis=1)
+    return points[keep] if keep.any() else points[:1]
+
+
+def _junctions(rings: list) -> set:
+    """Points where borders meet: points seen with more than one pair of neighbours"""
+    neighbours = defaultdict(set)
+    for ring in rings:
+        previous, following = np.roll(ring, 1, axis=0), np.roll(ring, -1, axis=0)
+        for point, before, after in zip(map(tuple, ring), map(tuple, previous), map(tuple, following)):
+            neighbours[point].add((min(before, after), max(before, after)))
+    return {point for point, pairs in neighbours.items() if len(pairs) > 1}
+
+
+def _ring_arcs(ring: np.ndarray, junctions: set, arcs: list, index: dict) -> list:
+    """Indexes of the arcs making up `ring`, adding the ones not seen yet; ~i is arc i reversed"""
+    points = list(map(tuple, ring))
+    cuts = [i for i, point in enumerate(points) if point in junctions]
+    if not cuts:
+        # A ring no other ring touches is a single arc, starting at its smallest point so both sides match
+        start = points.index(min(points))
+        points = points[start:] + points[:start]
+        return [_arc_index(points + points[:1], arcs, index)]
+    points = points[cuts[0]:] + points[:cuts[0]]
+    cuts = [cut - cuts[0] for cut in cuts] + [len(points)]
+    points.append(points[0])
+    return [_arc_index(points[start:end + 1], arcs, index) for start, end in zip(cuts[:-1], cuts[1:])]
+
+
+def _arc_index(points: list, arcs: list, index: dict) -> int:
+    key = tuple(points)
+    if key in index:
+        return index[key]
+    # The same arc traversed the other way, closed arcs included since they start at their smallest point
+    if key[::-1] in index:
+        return ~index[key[::-1]]
+    index[key] = len(arcs)
+    arcs.append(np.array(points))
+    return index[key]
@@ -2,8 +2,19 @@
 from os.path import join, dirname, isdir, abspath
 from os import getenv, getcwd, mkdir
 from dotenv import load_dotenv, find_dotenv
+import streamlit as st
 
 ENVARS = ["SNOWFLAKE_USER", "SNOWFLAKE_PASSWORD", "SNOWFLAKE_ACCOUNT", "SNOWFLAKE_DATABASE", "SNOWFLAKE_SCHEMA"]
+
+# Variables each DATA_BACKEND needs
+BACKEND_ENVARS = {
+    "snowflake": ENVARS,
+    "local": ["LOCAL_DATA_DIR"],
+    "bundle": ["BUNDLE_DIR"],
+}
+
+# Decorator for page sections: a widget inside one reruns only that section (st.fragment, experimental before 1.37)
+fragment = getattr(st, "fragment", None) or st.experimental_fragment
     
     
 def handle_env():
@@ -14,7 +25,7 @@ def handle_env():
     except:
         pass
     finally:
-        for var in ENVARS:
+        for var in BACKEND_ENVARS.get(getenv("DATA_BACKEND", "snowflake").lower(), []):
             val = getenv(var)
             if val is None:
                 raise ValueError(f"Missing environment variable: {var}")
\ No newline at end of file
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+
+# The app's modules import each other by name from the streamlit/ directory
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "streamlit"))
+
+# No background refresh thread while testing
+os.environ.setdefault("REFRESH_INTERVAL", "0")
+
+# Cached results and aggregates go to a scratch directory instead of the app's cache
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="tests-cache-"))
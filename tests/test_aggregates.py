@@ -0,0 +1,91 @@
+import pandas as pd
+
+from aggregates import CommunityPriceAggregate, DailyPriceAggregate
+from data import LocalConnector
+
+
+def write_tables(directory):
+    """Minimal local exports of every table, the calendar covering 2024-01-01 and 2024-01-02"""
+    pd.DataFrame({'listing_id': [1, 2], 'community_id': [1, 1]}).to_csv(directory / "listings.csv", index=False)
+    pd.DataFrame({'review_id': [1], 'listing_id': [1], 'date': ['2024-01-01']}).to_csv(directory / "reviews.csv", index=False)
+    pd.DataFrame({'community_id': [1], 'community': ['LOOP']}).to_csv(directory / "communities.csv", index=False)
+    write_calendar(directory / "calendar_1.csv", ['2024-01-01', '2024-01-02'], price=100)
+
+
+def write_calendar(path, dates, price):
+    rows = [(listing_id, date, 't', price) for date in dates for listing_id in (1, 2)]
+    pd.DataFrame(rows, columns=['listing_id', 'date', 'available', 'price']).to_csv(path, index=False)
+
+
+class SpyConnector(LocalConnector):
+    """Records the parameters of every aggregate query"""
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir)
+        self.since = []
+        self.until = []
+
+    def read_sql(self, query, params=None):
+        if params and "since" in params:
+            self.since.append(params["since"])
+        if params and "until" in params:
+            self.until.append(params["until"])
+        return super().read_sql(query, params)
+
+
+def test_appended_dates_are_aggregated_alone(tmp_path):
+    write_tables(tmp_path)
+    connector = SpyConnector(str(tmp_path))
+    aggregate = DailyPriceAggregate(str(tmp_path / "aggregates"), "daily_price")
+    aggregate.update(connector)
+
+    write_calendar(tmp_path / "calendar_2.csv", ['2024-01-03', '2024-01-04'], price=300)
+    frame = aggregate.update(connector)
+
+    assert connector.since[-1] == "2024-01-03"
+    assert list(pd.to_datetime(frame['DATE']).dt.strftime("%Y-%m-%d")) == ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04']
+    assert list(frame['PRICE_SUM']) == [200, 200, 600, 600]
+
+
+def test_rewritten_dates_are_aggregated_again(tmp_path):
+    write_tables(tmp_path)
+    connector = SpyConnector(str(tmp_path))
+    aggregate = DailyPriceAggregate(str(tmp_path / "aggregates"), "daily_price")
+    aggregate.update(connector)
+
+    write_calendar(tmp_path / "calendar_2.csv", ['2024-01-02'], price=50)
+    frame = aggregate.update(connector)
+
+    assert connector.since[-1] == "2024-01-02"
+    assert list(frame['PRICE_SUM']) == [200, 300]
+    assert list(frame['PRICE_COUNT']) == [2, 4]
+
+
+def test_unchanged_calendar_is_not_scanned(tmp_path):
+    write_tables(tmp_path)
+    connector = SpyConnector(str(tmp_path))
+    aggregate = DailyPriceAggregate(str(tmp_path / "aggregates"), "daily_price")
+    aggregate.update(connector)
+    aggregate.update(connector)
+
+    assert connector.since == ["1900-01-01"]
+
+
+def test_community_prices_follow_appended_dates_and_reassigned_listings(tmp_path):
+    write_tables(tmp_path)
+    connector = SpyConnector(str(tmp_path))
+    aggregate = CommunityPriceAggregate(str(tmp_path / "aggregates"), "community_price")
+    # One of the two listings moves, which would otherwise be enough to rebuild from scratch
+    aggregate.MAX_REASSIGNED = 1
+    aggregate.update(connector, pd.Series([1, 1], index=[1, 2]))
+
+    write_calendar(tmp_path / "calendar_2.csv", ['2024-01-03'], price=300)
+    frame = aggregate.update(connector, pd.Series([1, 2], index=[1, 2]))
+
+    assert connector.since[-1] == "2024-01-03"
+    assert connector.until == ["2024-01-03"]
+    rows = {(row.COMMUNITY_ID, row.DATE.strftime("%Y-%m-%d")): (row.PRICE_SUM, row.PRICE_COUNT) for row in frame.itertuples()}
+    assert rows == {
+        (1, '2024-01-01'): (100, 1), (1, '2024-01-02'): (100, 1), (1, '2024-01-03'): (300, 1),
+        (2, '2024-01-01'): (100, 1), (2, '2024-01-02'): (100, 1), (2, '2024-01-03'): (300, 1),
+    }
@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import data
+from amenities import AmenityIndex, build_bitmaps
+from cache import RESULT_CACHE
+from data import LocalConnector
+
+
+def write_listings(directory, amenities):
+    pd.DataFrame({
+        'listing_id': range(1, len(amenities) + 1),
+        'price': [100.0 * (i + 1) for i in range(len(amenities))],
+        'amenities': [json.dumps(names) for names in amenities],
+    }).to_csv(directory / "listings.csv", index=False)
+    pd.DataFrame({'listing_id': [1], 'date': ['2024-01-01'], 'available': ['t'], 'price': [100]}).to_csv(directory / "calendar.csv", index=False)
+    pd.DataFrame({'review_id': [1], 'listing_id': [1], 'date': ['2024-01-01']}).to_csv(directory / "reviews.csv", index=False)
+    pd.DataFrame({'community_id': [1], 'name': ['LOOP']}).to_csv(directory / "communities.csv", index=False)
+
+
+def test_selection_without_listings_has_no_average():
+    index = AmenityIndex([100.0, 200.0], build_bitmaps([["Wifi"], ["Pool"]]))
+    stats = index.select(["Wifi", "Pool"])
+    assert stats['LISTING_COUNT'] == 0
+    assert np.isnan(stats['AVERAGE_PRICE'])
+
+
+def test_summary_is_computed_once_and_copied():
+    index = AmenityIndex([100.0, 200.0], build_bitmaps([["Wifi"], ["Wifi", "Pool"]]))
+    summary = index.summary()
+    summary['AVERAGE_PRICE'] = 0
+    assert index.summary() is not index.summary()
+    assert list(index.summary()['AVERAGE_PRICE']) == [200.0, 150.0]
+
+
+def test_index_is_reused_until_the_listings_are_reloaded(tmp_path, monkeypatch):
+    write_listings(tmp_path, [["Wifi"], ["Wifi", "Pool"]])
+    connector = LocalConnector(str(tmp_path))
+    first = connector.amenity_index()
+
+    # Reruns read the version from table metadata, the listings are not hashed again
+    hashed = []
+    monkeypatch.setattr(data, "listings_version", lambda *args: hashed.append(args) or "")
+    assert connector.amenity_index() is first
+    assert hashed == []
+    monkeypatch.undo()
+
+    # What the refresh scheduler does when it sees the listings change
+    write_listings(tmp_path, [["Wifi"], ["Pool"], ["Pool"]])
+    RESULT_CACHE.mark_stale("listings")
+    type(connector).retrieve_amenity_index.refresh(connector)
+    reloaded = connector.amenity_index()
+    assert reloaded is not first
+    assert reloaded.select(["Pool"])['LISTING_COUNT'] == 2
@@ -0,0 +1,55 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data import BundleConnector
+from precompute import LATEST, MANIFEST, sha256
+
+
+def write_bundle(out_dir, version, price, count):
+    """Bundle holding just the files the hex grid, price series and comps index are derived from"""
+    bundle_dir = out_dir / version
+    os.makedirs(bundle_dir)
+    rng = np.random.default_rng(count)
+    points = pd.DataFrame({
+        'LISTING_ID': range(count),
+        'LONGITUDE': -87.65 + rng.uniform(-0.05, 0.05, count),
+        'LATITUDE': 41.88 + rng.uniform(-0.05, 0.05, count),
+        'PRICE': np.full(count, float(price)),
+        'REVIEW_SCORES_RATING': np.full(count, 4.5),
+    })
+    frames = {
+        "retrieve_listing_points.parquet": points,
+        "retrieve_listing_comps.parquet": points.assign(ROOM_TYPE="Entire home/apt", BEDROOMS=1, ACCOMMODATES=2),
+        "retrieve_daily_price_aggregate.parquet": pd.DataFrame({
+            'DATE': pd.to_datetime(['2024-01-01', '2024-01-02']),
+            'PRICE_SUM': [price * count] * 2,
+            'PRICE_COUNT': [count] * 2,
+        }),
+    }
+    files = {}
+    for name, frame in frames.items():
+        frame.to_parquet(bundle_dir / name, index=False)
+        files[name] = {"sha256": sha256(str(bundle_dir / name)), "rows": len(frame)}
+    with open(bundle_dir / MANIFEST, "w") as f:
+        json.dump({"version": version, "files": files}, f)
+    with open(out_dir / LATEST, "w") as f:
+        f.write(version)
+
+
+def test_moving_latest_serves_the_new_bundle(tmp_path):
+    write_bundle(tmp_path, "20240101T000000Z", price=100, count=20)
+    before = BundleConnector(str(tmp_path))
+    hexes = before.retrieve_hex_grid()
+    prices = before.retrieve_price_over_time()
+    comps = before.comparables_index()
+
+    write_bundle(tmp_path, "20240201T000000Z", price=300, count=30)
+    after = BundleConnector(str(tmp_path))
+
+    assert after.backend_key() != before.backend_key()
+    assert after.retrieve_hex_grid()['LISTING_COUNT'].sum() == 30 != hexes['LISTING_COUNT'].sum()
+    assert list(after.retrieve_price_over_time()['AVG_PRICE']) == [300, 300] != list(prices['AVG_PRICE'])
+    assert len(after.comparables_index().listings) == 30 != len(comps.listings)
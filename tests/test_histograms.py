@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from histograms import histogram_in_memory, summary_in_memory
+
+
+def hosts():
+    return pd.DataFrame({
+        'HOST_IS_SUPERHOST': [0, 0, 0, 1, 1],
+        'AVG_REVIEWS_PER_MONTH': [0.5, 1.5, 9.0, 2.0, 3.0],
+        'LISTING_COUNT': [1, 1, 2, 1, 4],
+    })
+
+
+def test_fixed_bins_leave_out_hosts_outside_the_range():
+    frame = histogram_in_memory(hosts(), "AVG_REVIEWS_PER_MONTH", bins=4, method="fixed", low=0, high=4)
+    counts = frame.set_index(['HOST_IS_SUPERHOST', 'BIN'])['HOST_COUNT']
+    assert list(counts.loc[0]) == [1, 1, 0, 0]
+    assert list(counts.loc[1]) == [0, 0, 1, 1]
+    assert list(frame['LOW'].unique()) == [0, 1, 2, 3]
+
+
+def test_repeated_quantiles_collapse_into_one_bin():
+    # The minimum and the median listing count are both 1
+    frame = histogram_in_memory(hosts(), "LISTING_COUNT", bins=2, method="quantile")
+    assert frame['HOST_COUNT'].sum() == 5
+    assert list(frame['BIN'].unique()) == [0]
+    assert (frame['LOW'].iloc[0], frame['HIGH'].iloc[0]) == (1, 4)
+
+
+def test_summary_per_superhost_flag():
+    summary = summary_in_memory(hosts(), "AVG_REVIEWS_PER_MONTH").set_index('HOST_IS_SUPERHOST')
+    assert summary.loc[1, 'HOST_COUNT'] == 2
+    assert summary.loc[0, 'MEDIAN'] == 1.5
+    assert summary.loc[1, 'STD'] == pytest.approx(np.std([2.0, 3.0], ddof=1))
+
+
+def test_unknown_measure_is_rejected():
+    with pytest.raises(ValueError):
+        summary_in_memory(hosts(), "PRICE")
@@ -0,0 +1,43 @@
+import pytest
+from snowflake.connector import errors
+
+from data import SnowflakeConnector
+from pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def is_closed(self):
+        return self.closed
+
+
+def snowflake_pool() -> ConnectionPool:
+    # Snowflake's pool options without opening a session
+    options = SnowflakeConnector.__new__(SnowflakeConnector).pool_options()
+    return ConnectionPool(factory=FakeConnection, **options)
+
+
+def test_sql_error_returns_connection_to_pool():
+    pool = snowflake_pool()
+    with pytest.raises(errors.ProgrammingError):
+        with pool.connection() as connection:
+            raise errors.ProgrammingError("SQL compilation error")
+    assert not connection.closed
+    with pool.connection() as reused:
+        assert reused is connection
+    assert pool.stats()["reused"] == 1
+
+
+@pytest.mark.parametrize("error", [errors.OperationalError, errors.InterfaceError])
+def test_connection_error_discards_connection(error):
+    pool = snowflake_pool()
+    with pytest.raises(error):
+        with pool.connection() as connection:
+            raise error("session lost")
+    assert connection.closed
+    assert pool.stats()["size"] == 0